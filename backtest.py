@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import re
+
+import numpy as np
+import pandas as pd
+
+from mlb_bot import (
+    DATA_DIRECTORY, ResultsIngester, close_http_session, consensus_moneyline, extract_confidence,
+    extract_pick, get_prediction_store, iter_json_predictions
+)
+
+CONFIDENCE_MULTIPLIERS = {'low': 0.5, 'medium': 1.0, 'high': 1.5}
+
+def parse_odds_info(odds_info, team):
+    # Older records only kept the prompt's odds block: "<team>: -150, -145, -140"
+    match = re.search(rf"^{re.escape(team)}: (.*)$", odds_info or "", re.MULTILINE)
+    if not match:
+        return None
+    prices = [int(p) for p in re.findall(r"[-+]?\d+", match.group(1))]
+    return consensus_moneyline(prices)
+
+def prediction_record(date, model, data):
+    home_team, away_team = data['home_team'], data['away_team']
+    moneyline = data.get('moneyline') or {
+        'home': parse_odds_info(data.get('odds_info'), home_team),
+        'away': parse_odds_info(data.get('odds_info'), away_team),
+    }
+    return {
+        'date': date,
+        'model': model,
+        'game_id': str(data.get('game_id') or data['game']),
+        'game': data['game'],
+        'game_datetime': data.get('game_datetime') or data['timestamp'],
+        'home_team': home_team,
+        'away_team': away_team,
+        'pick': data.get('pick') or extract_pick(data.get('response'), home_team, away_team),
+        'confidence': data.get('confidence') or extract_confidence(data.get('response')),
+        'probability': data.get('probability'),
+        'home_ml': moneyline['home'],
+        'away_ml': moneyline['away'],
+    }
+
+def load_predictions(base_directory=DATA_DIRECTORY, source='store'):
+    if source == 'json':
+        rows = [
+            (date, model, data)
+            for date, model, _, predictions in iter_json_predictions(base_directory)
+            for data in predictions
+        ]
+    else:
+        rows = asyncio.run(get_prediction_store(base_directory).load())
+    return pd.DataFrame([prediction_record(date, model, data) for date, model, data in rows])
+
+def load_results(base_directory=DATA_DIRECTORY):
+    results = pd.DataFrame(asyncio.run(get_prediction_store(base_directory).load_results()))
+    if results.empty:
+        return pd.DataFrame(columns=['game_id', 'date', 'game', 'home_score', 'away_score'])
+    return results[results['final'] == 1][['game_id', 'date', 'game', 'home_score', 'away_score']]
+
+def ingest_results(base_directory, start_date, end_date):
+    async def ingest():
+        try:
+            return await ResultsIngester(get_prediction_store(base_directory)).ingest(start_date, end_date)
+        finally:
+            await close_http_session()
+    return asyncio.run(ingest())
+
+def join_results(predictions, results):
+    joined = predictions.merge(results[['game_id', 'home_score', 'away_score']], on='game_id', how='left')
+    # Records imported from the JSON tree have no gamePk, fall back to date and matchup
+    by_matchup = predictions[['date', 'game']].merge(
+        results[['date', 'game', 'home_score', 'away_score']].drop_duplicates(['date', 'game']),
+        on=['date', 'game'], how='left'
+    )
+    for column in ('home_score', 'away_score'):
+        joined[column] = joined[column].fillna(by_matchup[column])
+    return joined
+
+def settle(joined):
+    settled = joined.dropna(subset=['home_score', 'away_score', 'pick']).copy()
+    picked_home = (settled['pick'] == settled['home_team']).to_numpy()
+    home_won = (settled['home_score'] > settled['away_score']).to_numpy()
+    price = np.where(picked_home, settled['home_ml'].to_numpy(dtype=float), settled['away_ml'].to_numpy(dtype=float))
+    settled['win'] = np.where(picked_home, home_won, ~home_won)
+    settled['decimal_odds'] = np.where(price > 0, 1 + price / 100, 1 + 100 / np.abs(price))
+    # A bet with no recorded price can't be graded, keep it out of the counts and rates as well as the P&L
+    settled = settled[np.isfinite(settled['decimal_odds'])].copy()
+    settled['game_datetime'] = pd.to_datetime(settled['game_datetime'], utc=True)
+    return settled.sort_values(['game_datetime', 'model']).reset_index(drop=True)
+
+def flat_stake(settled, unit=100):
+    return np.full(len(settled), float(unit))
+
+def confidence_stake(settled, unit=100):
+    return settled['confidence'].map(CONFIDENCE_MULTIPLIERS).fillna(1.0).to_numpy() * unit
+
+def kelly_stake(settled, unit=100, fraction=0.5, bankroll=1000, cap=0.25):
+    # Only forecast models report a probability; chat models fall back to a flat unit
+    p = settled['probability'].to_numpy(dtype=float) / 100
+    b = settled['decimal_odds'].to_numpy() - 1
+    kelly = np.clip((b * p - (1 - p)) / b, 0, cap) * fraction
+    return np.where(np.isnan(p), unit, kelly * bankroll)
+
+STAKING_RULES = {
+    'flat': flat_stake,
+    'confidence': confidence_stake,
+    'kelly': kelly_stake,
+}
+
+def profit_and_loss(settled, stake):
+    win = settled['win'].to_numpy()
+    pnl = np.where(win, stake * (settled['decimal_odds'].to_numpy() - 1), -stake)
+    return settled.assign(stake=stake, pnl=pnl)
+
+def summarize(bets):
+    bets = bets.assign(cum_pnl=bets.groupby('model')['pnl'].cumsum())
+    peak = bets.groupby('model')['cum_pnl'].cummax().clip(lower=0)
+    bets = bets.assign(drawdown=peak - bets['cum_pnl'])
+    summary = bets.groupby('model').agg(
+        bets=('win', 'size'),
+        win_rate=('win', 'mean'),
+        staked=('stake', 'sum'),
+        pnl=('pnl', 'sum'),
+        expectancy=('pnl', 'mean'),
+        max_drawdown=('drawdown', 'max'),
+    )
+    summary['roi'] = summary['pnl'] / summary['staked'].where(summary['staked'] > 0)
+    return summary
+
+def replay(settled, rules=('flat',), unit=100):
+    return pd.concat(
+        {rule: summarize(profit_and_loss(settled, STAKING_RULES[rule](settled, unit))) for rule in rules},
+        names=['staking', 'model']
+    )
+
+def daily_pnl(settled, rule='flat', unit=100):
+    bets = profit_and_loss(settled, STAKING_RULES[rule](settled, unit))
+    return bets.pivot_table(index='model', columns='date', values='pnl', aggfunc='sum', fill_value=0)
+
+def run_backtest(base_directory=DATA_DIRECTORY, source='store', rules=('flat',), unit=100, ingest=False):
+    predictions = load_predictions(base_directory, source)
+    if predictions.empty:
+        return None, None
+    if ingest:
+        ingest_results(base_directory, predictions['date'].min(), predictions['date'].max())
+    settled = settle(join_results(predictions, load_results(base_directory)))
+    return settled, replay(settled, rules, unit)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backtest stored MLB predictions against final scores")
+    parser.add_argument('--base-directory', default=DATA_DIRECTORY)
+    parser.add_argument('--source', choices=['store', 'json'], default='store',
+                        help="Read predictions from the SQLite store or the legacy predictions/<date>/*.json tree")
+    parser.add_argument('--stake', nargs='+', choices=sorted(STAKING_RULES), default=['flat'])
+    parser.add_argument('--unit', type=float, default=100)
+    parser.add_argument('--daily', action='store_true', help="Also print per-day P&L for the first staking rule")
+    parser.add_argument('--ingest', action='store_true',
+                        help="Fetch any missing final scores for the predicted dates before grading")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    settled, summary = run_backtest(args.base_directory, args.source, args.stake, args.unit, args.ingest)
+    if summary is None:
+        print("No predictions found")
+        return
+    print(f"{len(settled)} settled predictions")
+    print(summary.to_string(float_format=lambda v: f"{v:.4f}"))
+    if args.daily:
+        print(daily_pnl(settled, args.stake[0], args.unit).to_string(float_format=lambda v: f"{v:.2f}"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import tempfile
+import time
+from datetime import timedelta
+
+import numpy as np
+import pytz
+from aiohttp import web
+
+import mlb_bot
+from mlb_bot import (
+    AdaptiveLimiter, AppContext, AsyncScrapeSportsbookreview, MLBBot, RATE_BUDGETS, RetryPolicy,
+    close_http_session, get_current_et_time, set_app_context
+)
+
+logger = logging.getLogger(__name__)
+
+BUILD_ID = "benchmark-build"
+SPORTSBOOKS = ["fanduel", "draftkings", "betmgm", "caesars", "pointsbet", "bet365"]
+TEAMS = [
+    "Arizona Diamondbacks", "Atlanta Braves", "Baltimore Orioles", "Boston Red Sox", "Chicago Cubs",
+    "Chicago White Sox", "Cincinnati Reds", "Cleveland Guardians", "Colorado Rockies", "Detroit Tigers",
+    "Houston Astros", "Kansas City Royals", "Los Angeles Angels", "Los Angeles Dodgers", "Miami Marlins",
+    "Milwaukee Brewers", "Minnesota Twins", "New York Mets", "New York Yankees", "Oakland Athletics",
+    "Philadelphia Phillies", "Pittsburgh Pirates", "San Diego Padres", "San Francisco Giants", "Seattle Mariners",
+    "St. Louis Cardinals", "Tampa Bay Rays", "Texas Rangers", "Toronto Blue Jays", "Washington Nationals",
+]
+
+DEFAULT_LATENCIES = {
+    # Mean seconds per request for each stand-in; each response is jittered +/-50%
+    'sportsbookreview': 0.15,
+    'mlb': 0.10,
+    'news': 0.30,
+    'chat': 1.00,
+    'forecast': 2.00,
+}
+
+def synthetic_slate(n_games, now, first_pitch=(15, 55), seed=0):
+    # Games past the 15th reuse matchups as doubleheaders, so a 30-game slate exercises the join's tie-breaking
+    rng = random.Random(seed)
+    teams = TEAMS[:]
+    rng.shuffle(teams)
+    matchups = [(teams[i], teams[i + 1]) for i in range(0, len(teams), 2)]
+    offsets = np.linspace(first_pitch[0], first_pitch[1], n_games)
+    slate = []
+    for i in range(n_games):
+        away_team, home_team = matchups[i % len(matchups)]
+        game_time = (now + timedelta(minutes=float(offsets[i]))).astimezone(pytz.UTC).replace(microsecond=0)
+        slate.append({
+            'gamePk': 900000 + i,
+            'game_time': game_time,
+            'away_team': away_team,
+            'home_team': home_team,
+            'home_ml': {book: rng.choice([-1, 1]) * rng.randint(105, 220) for book in SPORTSBOOKS},
+        })
+    for game in slate:
+        # Mirror each home price with roughly 20 cents of vig on the other side
+        game['away_ml'] = {
+            book: -(price + 20) if price > 0 else max(100, -price - 20)
+            for book, price in game['home_ml'].items()
+        }
+    return slate
+
+class FakeServices:
+    def __init__(self, slate, latencies=None, error_rate=0.0, throttle_rate=0.0, seed=0):
+        self.slate = slate
+        self.latencies = dict(DEFAULT_LATENCIES, **(latencies or {}))
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.requests = {service: 0 for service in self.latencies}
+        self.errors = {service: 0 for service in self.latencies}
+        self.build_id = BUILD_ID
+        self.runner = None
+        self.base_url = None
+
+    async def start(self, host='127.0.0.1'):
+        app = web.Application()
+        app.router.add_get('/betting-odds/{league}/', self.landing_page)
+        app.router.add_get('/_next/data/{build}/betting-odds/{league}.json', self.spreads)
+        app.router.add_get('/_next/data/{build}/betting-odds/{league}/money-line/full-game.json', self.moneylines)
+        app.router.add_get('/api/v1/schedule/games/', self.schedule)
+        app.router.add_get('/api/v1/schedule', self.schedule)
+        app.router.add_get('/v1/news/search', self.news)
+        app.router.add_post('/v1/openai/chat/completions', self.chat)
+        app.router.add_get('/v1/chat/forecast', self.forecast)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def respond(self, service, payload, asknews=False):
+        self.requests[service] += 1
+        await asyncio.sleep(self.latencies[service] * self.rng.uniform(0.5, 1.5))
+        failure = self.failure(service, asknews)
+        if failure is not None:
+            return failure
+        if isinstance(payload, str):
+            return web.Response(text=payload, content_type='text/html')
+        return web.json_response(payload)
+
+    async def stream(self, request, service, chunks, asknews=True):
+        # A fifth of the latency passes before the first token, the rest is spread over the chunks
+        self.requests[service] += 1
+        latency = self.latencies[service] * self.rng.uniform(0.5, 1.5)
+        await asyncio.sleep(latency * 0.2)
+        failure = self.failure(service, asknews)
+        if failure is not None:
+            return failure
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        try:
+            for chunk in chunks:
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                await asyncio.sleep(latency * 0.8 / len(chunks))
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client hung up mid-stream, e.g. its attempt timed out after reading the pick
+            pass
+        return response
+
+    def failure(self, service, asknews):
+        roll = self.rng.random()
+        if asknews and roll < self.throttle_rate:
+            self.errors[service] += 1
+            # asknews_sdk maps the body's code, not the HTTP status, onto its exception types
+            return web.json_response({'code': 429000, 'detail': "Rate limit exceeded"}, status=429)
+        if roll < self.throttle_rate + self.error_rate:
+            self.errors[service] += 1
+            if asknews:
+                return web.json_response({'code': 500000, 'detail': "Internal server error"}, status=500)
+            return web.Response(status=503, text="Service unavailable")
+        return None
+
+    def game_rows(self, line_key):
+        rows = []
+        for game in self.slate:
+            view = {
+                'gameId': game['gamePk'] + 1000,
+                'startDate': game['game_time'].strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+                'homeTeam': {'fullName': game['home_team']},
+                'awayTeam': {'fullName': game['away_team']},
+            }
+            odds_views = [
+                {'sportsbook': book, line_key: {'homeOdds': game['home_ml'][book], 'awayOdds': game['away_ml'][book]}}
+                for book in SPORTSBOOKS
+            ] if line_key else []
+            rows.append({'gameView': view, 'oddsViews': odds_views})
+        return {'pageProps': {'oddsTables': [{'oddsTableModel': {'gameRows': rows}}]}}
+
+    async def landing_page(self, request):
+        next_data = json.dumps({'buildId': self.build_id})
+        return await self.respond(
+            'sportsbookreview', f'<html><script id="__NEXT_DATA__" type="application/json">{next_data}</script></html>'
+        )
+
+    async def spreads(self, request):
+        if request.match_info['build'] != self.build_id:
+            return web.Response(status=404, text="This page could not be found")
+        return await self.respond('sportsbookreview', self.game_rows(None))
+
+    async def moneylines(self, request):
+        if request.match_info['build'] != self.build_id:
+            return web.Response(status=404, text="This page could not be found")
+        return await self.respond('sportsbookreview', self.game_rows('currentLine'))
+
+    async def schedule(self, request):
+        games = [{
+            'gamePk': game['gamePk'],
+            'gameDate': game['game_time'].strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'officialDate': game['game_time'].astimezone(pytz.timezone('America/New_York')).strftime('%Y-%m-%d'),
+            'status': {'abstractGameState': 'Preview', 'detailedState': 'Scheduled'},
+            'teams': {'away': {'team': {'name': game['away_team']}}, 'home': {'team': {'name': game['home_team']}}},
+        } for game in self.slate]
+        payload = {'dates': [{'date': games[0]['officialDate'], 'games': games}] if games else []}
+        # Like the real endpoint, answer repeat requests for an unchanged schedule with 304 Not Modified
+        etag = '"' + hashlib.sha256(json.dumps(payload).encode()).hexdigest()[:16] + '"'
+        if request.headers.get('If-None-Match') == etag:
+            self.requests['mlb'] += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        response = await self.respond('mlb', payload)
+        if response.status == 200:
+            response.headers['ETag'] = etag
+        return response
+
+    def matchup(self, text):
+        named = sorted((text.find(team), team) for team in TEAMS if team in text)
+        return [team for _, team in named[:2]] or ["Home Team", "Away Team"]
+
+    async def news(self, request):
+        teams = self.matchup(request.query.get('query', ''))
+        articles = "\n".join(f"<doc>{' vs '.join(teams)} notebook #{i}: rotation and bullpen notes.</doc>" for i in range(6))
+        return await self.respond('news', {'as_string': articles, 'offset': 0}, asknews=True)
+
+    async def chat(self, request):
+        body = await request.json()
+        teams = self.matchup(body['messages'][-1]['content'])
+        pick = self.rng.choice(teams)
+        confidence = self.rng.choice(['low', 'medium', 'high'])
+        content = (f"My prediction is: {pick} to win. Confidence level: {confidence}.\n\n"
+                   + " ".join(f"Factor {i}: the starters, bullpens and current prices point the same way." for i in range(1, 11)))
+        completion = {
+            'id': f"chatcmpl-{self.rng.getrandbits(32):08x}",
+            'model': body.get('model', 'benchmark'),
+            'created': int(time.time()),
+            'usage': {'prompt_tokens': len(body['messages'][-1]['content']) // 4, 'completion_tokens': 200, 'total_tokens': 0},
+        }
+        if body.get('stream'):
+            pieces = re.findall(r"\S+\s*", content)
+            return await self.stream(request, 'chat', [
+                dict(completion, object='chat.completion.chunk', choices=[{
+                    'index': 0, 'delta': {'role': 'assistant', 'content': piece}, 'finish_reason': None
+                }])
+                for piece in pieces
+            ])
+        return await self.respond('chat', dict(completion, object='chat.completion', choices=[
+            {'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}
+        ]), asknews=True)
+
+    async def forecast(self, request):
+        teams = self.matchup(request.query.get('query', ''))
+        pick = self.rng.choice(teams)
+        probability = self.rng.randint(40, 70)
+        return await self.respond('forecast', {
+            'forecast': f"{pick} win",
+            'resolution_criteria': "Resolves on the official final score.",
+            'date': get_current_et_time().isoformat(),
+            'reasoning': f"{pick} have the stronger starter and the healthier bullpen.",
+            'sources': [],
+            'timeline': [],
+            'opposite_request': "",
+            'confidence': probability / 100,
+            'choice': pick,
+            'llm_confidence': probability,
+            'model_used': request.query.get('model', 'benchmark'),
+            'likelihood': "likely" if probability >= 55 else "toss-up",
+            'probability': probability,
+            'web_search_results': [],
+            'summary': "",
+            'key_people': [],
+            'key_facets': [],
+            'reconciled_information': "",
+            'candidate_models': [],
+            'unique_information': "",
+            'expert_information': {},
+        }, asknews=True)
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+        self._patched = []
+
+    def record(self, stage, elapsed):
+        self.samples.setdefault(stage, []).append(elapsed)
+
+    def wrap(self, owner, attribute, stage):
+        # stage is a name or a callable picking the name from the call's arguments
+        original = getattr(owner, attribute)
+        timer = self
+
+        async def timed(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                timer.record(stage(*args, **kwargs) if callable(stage) else stage, time.perf_counter() - start_time)
+
+        setattr(owner, attribute, timed)
+        self._patched.append((owner, attribute, original))
+
+    def restore(self):
+        for owner, attribute, original in reversed(self._patched):
+            setattr(owner, attribute, original)
+        self._patched = []
+
+    def percentiles(self):
+        return {
+            stage: {
+                'count': len(samples),
+                'p50': float(np.percentile(samples, 50)),
+                'p99': float(np.percentile(samples, 99)),
+                'max': max(samples),
+            }
+            for stage, samples in sorted(self.samples.items())
+        }
+
+class LoopLagMonitor:
+    def __init__(self, interval=0.01, threshold=0.005):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = []
+        self._task = None
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self._task = asyncio.create_task(self._sample())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self):
+        lags = np.array(self.lags or [0.0])
+        blocked = lags[lags > self.threshold]
+        return {
+            'samples': len(self.lags),
+            'p99': float(np.percentile(lags, 99)),
+            'max': float(lags.max()),
+            'blocked_total': float(blocked.sum()),
+            'blocked_events': int(len(blocked)),
+        }
+
+def scaled_budgets(scale):
+    # Compresses the per-model request budgets in time; burst sizes stay as configured
+    return {endpoint: (rate * scale, burst) for endpoint, (rate, burst) in RATE_BUDGETS.items()}
+
+async def run_benchmark(n_games, latencies=None, error_rate=0.0, throttle_rate=0.0, budget_scale=60,
+                        retry_delay=None, seed=0):
+    from asknews_sdk import AsyncAskNewsSDK
+
+    slate = synthetic_slate(n_games, get_current_et_time(), seed=seed)
+    services = FakeServices(slate, latencies, error_rate, throttle_rate, seed)
+    base_url = await services.start()
+
+    saved = (mlb_bot.SPORTSBOOKREVIEW_URL, mlb_bot.MLB_STATS_API_URL, mlb_bot.retry_policy)
+    mlb_bot.SPORTSBOOKREVIEW_URL = base_url
+    mlb_bot.MLB_STATS_API_URL = f"{base_url}/api/v1"
+    mlb_bot.retry_policy = RetryPolicy(base_delay=retry_delay if retry_delay is not None else RetryPolicy().base_delay)
+    set_app_context(AppContext(sdk=AsyncAskNewsSDK(api_key="benchmark", base_url=base_url)))
+
+    timer = StageTimer()
+    timer.wrap(mlb_bot, 'fetch_schedule', 'schedule')
+    timer.wrap(AsyncScrapeSportsbookreview, '_scrape', 'scrape')
+    timer.wrap(mlb_bot, 'call_asknews', lambda endpoint, *args, **kwargs: f"asknews_{endpoint}")
+    timer.wrap(mlb_bot, 'append_game_result', 'write')
+    timer.wrap(MLBBot, 'process_single_game', 'game')
+    monitor = LoopLagMonitor()
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            bot = MLBBot(base_directory=directory)
+            bot.limiter = AdaptiveLimiter(budgets=scaled_budgets(budget_scale))
+            monitor.start()
+            start_time = time.perf_counter()
+            await bot.fetch_today_games()
+            await bot.process_upcoming_games()
+            processed_at = time.perf_counter()
+            # A heartbeat pass retries whatever the first pass dropped
+            await bot.heartbeat()
+            elapsed = time.perf_counter() - start_time
+            await monitor.stop()
+            stored = len(await bot.prediction_store.load())
+            bot.prediction_store.close()
+    finally:
+        timer.restore()
+        mlb_bot.SPORTSBOOKREVIEW_URL, mlb_bot.MLB_STATS_API_URL, mlb_bot.retry_policy = saved
+        set_app_context(None)
+        await close_http_session()
+        await services.stop()
+
+    expected = n_games * len(mlb_bot.prediction_models())
+    return {
+        'games': n_games,
+        'predictions': stored,
+        'expected': expected,
+        'elapsed': elapsed,
+        'first_pass': processed_at - start_time,
+        'throughput': stored / elapsed if elapsed else 0.0,
+        'stages': timer.percentiles(),
+        'loop': monitor.summary(),
+        'limiter': bot.limiter.snapshot(),
+        'requests': services.requests,
+        'errors': services.errors,
+    }
+
+def format_report(report):
+    lines = [
+        f"{report['games']} games: {report['predictions']}/{report['expected']} predictions in {report['elapsed']:.2f}s "
+        f"(first pass {report['first_pass']:.2f}s, {report['throughput']:.2f} predictions/s)",
+        f"  {'stage':<16}{'count':>7}{'p50':>10}{'p99':>10}{'max':>10}",
+    ]
+    for stage, stats in report['stages'].items():
+        lines.append(f"  {stage:<16}{stats['count']:>7}{stats['p50']:>10.3f}{stats['p99']:>10.3f}{stats['max']:>10.3f}")
+    loop = report['loop']
+    lines.append(f"  event loop lag: p99 {loop['p99'] * 1000:.1f}ms, max {loop['max'] * 1000:.1f}ms, "
+                 f"blocked {loop['blocked_total'] * 1000:.1f}ms over {loop['blocked_events']} samples")
+    limiter = report['limiter']
+    lines.append(f"  limiter: window {limiter['window']}, avg wait {limiter['avg_wait']:.3f}s, "
+                 f"max wait {limiter['max_wait']:.3f}s, 429s {limiter['throttled']}, timeouts {limiter['timeouts']}, "
+                 f"deadline misses {limiter['expired']} ({limiter['miss_rate']:.1%})")
+    lines.append("  requests: " + ", ".join(
+        f"{service} {count} ({report['errors'][service]} failed)" for service, count in report['requests'].items()
+    ))
+    return "\n".join(lines)
+
+def parse_latency(value):
+    match = re.fullmatch(r"(\w+)=([\d.]+)", value)
+    if not match or match.group(1) not in DEFAULT_LATENCIES:
+        raise argparse.ArgumentTypeError(f"expected one of {', '.join(DEFAULT_LATENCIES)} as service=seconds")
+    return match.group(1), float(match.group(2))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark a prediction pass against local stand-ins for every external service")
+    parser.add_argument('--games', type=int, nargs='+', default=[15, 30], help="Slate sizes to run")
+    parser.add_argument('--latency', type=parse_latency, action='append', default=[], metavar='SERVICE=SECONDS',
+                        help=f"Override a stand-in's mean latency ({', '.join(DEFAULT_LATENCIES)})")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 5xx")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of AskNews requests answered with a 429")
+    parser.add_argument('--budget-scale', type=float, default=60,
+                        help="Multiplier on the per-model AskNews request rates (1 replays production pacing)")
+    parser.add_argument('--retry-delay', type=float, default=None, help="Base retry backoff in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="Show the bot's own logging")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    for n_games in args.games:
+        report = asyncio.run(run_benchmark(
+            n_games, dict(args.latency), args.error_rate, args.throttle_rate, args.budget_scale,
+            args.retry_delay, args.seed
+        ))
+        print(format_report(report))
+
+if __name__ == "__main__":
+    main()
@@ -1,160 +1,904 @@
 
 import os
 import json
-from dotenv import load_dotenv
-from asknews_sdk import AsyncAskNewsSDK
 import aiohttp
-import aiofiles
 from datetime import datetime, timedelta, date
 import asyncio
-from asyncio import Semaphore
 import time
-import requests
 import re
 import random
 import sqlite3
-import fcntl
 import pytz
 import logging
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import signal
+import socket
 import sys
+import argparse
+import bisect
+import contextlib
+import contextvars
+import functools
+import hashlib
+import heapq
+import itertools
+import math
+import threading
+from array import array
+from collections import deque
+from aiohttp import web
+import numpy as np
 from colorama import Fore, Back, Style, init
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-init(autoreset=True)
-load_dotenv()
-client_id_token = os.getenv('CLIENT_ID')
-client_secret_token = os.getenv('CLIENT_SECRET')
-odds_api_token = os.getenv('ODDS_API_KEY')
+class AppContext:
+    def __init__(self, sdk=None):
+        self._sdk = sdk
+        if sdk is not None:
+            # An injected client (e.g. pointed at a local stand-in) needs no credentials
+            self.client_id = self.client_secret = self.odds_api_key = None
+            return
 
-if not all([client_id_token, client_secret_token, odds_api_token]):
-    raise ValueError("Missing one or more environment variables: CLIENT_ID, CLIENT_SECRET, ODDS_API_KEY")
+        from dotenv import load_dotenv
+        load_dotenv()
+        self.client_id = os.getenv('CLIENT_ID')
+        self.client_secret = os.getenv('CLIENT_SECRET')
+        self.odds_api_key = os.getenv('ODDS_API_KEY')
 
-sdk = AsyncAskNewsSDK(
-    client_id=client_id_token,
-    client_secret=client_secret_token,
-    scopes=["chat", "news", "stories"]
-)
+        if not all([self.client_id, self.client_secret, self.odds_api_key]):
+            raise ValueError("Missing one or more environment variables: CLIENT_ID, CLIENT_SECRET, ODDS_API_KEY")
 
-class ScrapeSportsbookreview:
-    def __init__(self, sport='MLB', date="", current_line=True):
-        self.games = self.scrape_games(sport, date, current_line)
+    @property
+    def sdk(self):
+        if self._sdk is None:
+            from asknews_sdk import AsyncAskNewsSDK
+            self._sdk = AsyncAskNewsSDK(
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                scopes=["chat", "news", "stories"]
+            )
+        return self._sdk
+
+_app_context = None
+
+def get_app_context():
+    # Built on first use so importing this module needs no credentials or network
+    global _app_context
+    if _app_context is None:
+        _app_context = AppContext()
+    return _app_context
+
+def set_app_context(context):
+    global _app_context
+    _app_context = context
+
+def get_sdk():
+    return get_app_context().sdk
+
+def configure_logging():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    init(autoreset=True)
+
+SPORTSBOOKREVIEW_URL = "https://www.sportsbookreview.com"
+MLB_STATS_API_URL = "https://statsapi.mlb.com/api/v1"
+
+SPORT_DICT = {"NBA": "nba-basketball", "NFL": "nfl-football", "NHL": "nhl-hockey", "MLB": "mlb-baseball", "NCAAB": "ncaa-basketball"}
+
+_http_session = None
+
+async def get_http_session():
+    # One long-lived pooled session shared by the scraper and the MLB Stats API calls
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(limit=20, limit_per_host=6, ttl_dns_cache=300)
+        _http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=60),
+            headers={'User-Agent': 'Mozilla/5.0 (compatible; mlb-bot)'}
+        )
+    return _http_session
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=60))
-    def scrape_games(self, sport="MLB", date="", current_line=True):
-        if date == "":
-            date = datetime.today().strftime("%Y-%m-%d")
-        _line = 'currentLine' if current_line else 'openingLine'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)  # Seconds
+TRACE_HISTORY = 50  # Finished per-game traces kept for /traces
 
-        sport_dict = {"NBA": "nba-basketball", "NFL": "nfl-football", "NHL": "nhl-hockey", "MLB": "mlb-baseball", "NCAAB": "ncaa-basketball"}
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
 
-        spread_url = f"https://www.sportsbookreview.com/betting-odds/{sport_dict[sport]}/?date={date}"
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+_current_trace = contextvars.ContextVar('mlb_bot_trace', default=None)
+
+class Trace:
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = get_current_et_time().isoformat()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+
+    def add(self, stage, start, elapsed, labels):
+        self.spans.append({'stage': stage, 'offset': round(start - self.start, 4), 'duration': round(elapsed, 4), **labels})
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration': round(self.duration, 4) if self.duration is not None else None,
+            **self.attributes,
+            'spans': sorted(self.spans, key=lambda span: span['offset']),
+        }
+
+class Metrics:
+    def __init__(self, tracing=False, trace_history=TRACE_HISTORY):
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = {}
+        self.tracing = tracing
+        self.traces = deque(maxlen=trace_history)
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def record(self, stage, start, elapsed, **labels):
+        key = self.key('stage_seconds', dict(labels, stage=stage))
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        self.histograms[key].observe(elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, start, elapsed, labels)
+
+    @contextlib.contextmanager
+    def timer(self, stage, **labels):
+        start = time.perf_counter()
         try:
-            start_time = time.time()
-            r = requests.get(spread_url)
-            r.raise_for_status()
-            elapsed_time = time.time() - start_time
-            logger.info(f"API call to {spread_url} took {elapsed_time:.2f} seconds")
-            
-            j = re.findall('__NEXT_DATA__" type="application/json">(.*?)</script>', r.text)
-            
-            if not j:
-                logger.warning(f"No data found for {sport} on {date}")
-                return []
+            yield
+        except asyncio.TimeoutError:
+            self.inc('stage_timeouts_total', stage=stage, **labels)
+            raise
+        except Exception:
+            self.inc('stage_errors_total', stage=stage, **labels)
+            raise
+        finally:
+            self.record(stage, start, time.perf_counter() - start, **labels)
 
-            build_id = json.loads(j[0])['buildId']
-            spreads_url = f"https://www.sportsbookreview.com/_next/data/{build_id}/betting-odds/{sport_dict[sport]}.json?league={sport_dict[sport]}&date={date}"
-            
-            start_time = time.time()
-            spreads_response = requests.get(spreads_url)
-            spreads_response.raise_for_status()
-            elapsed_time = time.time() - start_time
-            logger.info(f"API call to {spreads_url} took {elapsed_time:.2f} seconds")
-            
-            spreads_json = spreads_response.json()
-            spreads_list = spreads_json['pageProps']['oddsTables'][0]['oddsTableModel']['gameRows']
-            spreads = {g['gameView']['gameId']: g for g in spreads_list}
+    @contextlib.contextmanager
+    def trace(self, name, **attributes):
+        # Spans recorded anywhere below this point, including in gathered child tasks, land on the trace
+        if not self.tracing:
+            yield None
+            return
+        trace = Trace(name, **attributes)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.duration = time.perf_counter() - trace.start
+            self.traces.append(trace)
 
-            moneyline_url = f"https://www.sportsbookreview.com/_next/data/{build_id}/betting-odds/{sport_dict[sport]}/money-line/full-game.json?league={sport_dict[sport]}&oddsType=money-line&oddsScope=full-game&date={date}"
-            
-            start_time = time.time()
-            moneyline_response = requests.get(moneyline_url)
-            moneyline_response.raise_for_status()
-            elapsed_time = time.time() - start_time
-            logger.info(f"API call to {moneyline_url} took {elapsed_time:.2f} seconds")
-            
-            moneyline_json = moneyline_response.json()
-            moneylines_list = moneyline_json['pageProps']['oddsTables'][0]['oddsTableModel']['gameRows']
-            moneylines = {g['gameView']['gameId']: g for g in moneylines_list}
+    def collect(self, name, samples):
+        # samples() yields (metric, labels, value) read at scrape time; re-registering a name replaces it
+        self.collectors[name] = samples
 
-            all_stats = {
-                game_id: {'spreads': spreads[game_id], 'moneylines': moneylines[game_id]} for game_id in spreads.keys()
-            }
+    def gauges(self):
+        return [sample for samples in self.collectors.values() for sample in samples()]
+
+    def snapshot(self):
+        return {
+            'counters': [dict(labels, name=name, value=value) for (name, labels), value in self.counters.items()],
+            'stages': [
+                dict(labels, count=h.count, sum=round(h.sum, 4), p50=h.quantile(0.5), p99=h.quantile(0.99))
+                for (name, labels), h in self.histograms.items()
+            ],
+            'gauges': [dict(labels, name=name, value=value) for name, labels, value in self.gauges()],
+        }
+
+    def render(self):
+        # Prometheus text exposition format
+        def fmt(labels):
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels) + "}"
+
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"mlb_bot_{name}{fmt(labels)} {value}")
+        for (name, labels), h in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(h.buckets + ('+Inf',), h.counts):
+                cumulative += count
+                lines.append(f"mlb_bot_{name}_bucket{fmt(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"mlb_bot_{name}_sum{fmt(labels)} {h.sum:.6f}")
+            lines.append(f"mlb_bot_{name}_count{fmt(labels)} {h.count}")
+        for name, labels, value in self.gauges():
+            lines.append(f"mlb_bot_{name}{fmt(tuple(sorted(labels.items())))} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+async def start_metrics_server(port, host='127.0.0.1'):
+    async def metrics_text(request):
+        return web.Response(text=metrics.render(), content_type='text/plain')
+
+    async def metrics_json(request):
+        return web.json_response(metrics.snapshot())
+
+    async def traces(request):
+        return web.json_response([trace.as_dict() for trace in metrics.traces])
 
-            games = []
-            for event in all_stats.values():
-                game = {}
-                game['date'] = event['spreads']['gameView']['startDate']
-                game['home_team'] = event['spreads']['gameView']['homeTeam']['fullName']
-                game['away_team'] = event['spreads']['gameView']['awayTeam']['fullName']
-                game['id'] = f"{game['date']}_{game['away_team']}_{game['home_team']}"
-                game['home_ml'] = {}
-                game['away_ml'] = {}
-                if 'moneylines' in event and 'oddsViews' in event['moneylines'] and event['moneylines']['oddsViews']:
-                    for line in event['moneylines']['oddsViews']:
-                        if not line:
-                            continue
-                        game['home_ml'][line['sportsbook']] = line[_line]['homeOdds']
-                        game['away_ml'][line['sportsbook']] = line[_line]['awayOdds']
-                games.append(game)
-            return games
-        except requests.exceptions.RequestException as e:
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_text)
+    app.router.add_get('/metrics.json', metrics_json)
+    app.router.add_get('/traces', traces)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
+
+class DeadlineExceeded(Exception):
+    pass
+
+class StreamCutOff(Exception):
+    # A stream failed after enough of it was stored to keep; retrying would only repeat the call
+    pass
+
+class RetryPolicy:
+    def __init__(self, max_attempts=3, base_delay=4, max_delay=60, attempt_timeout=180, min_attempt_time=5):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.min_attempt_time = min_attempt_time
+        self.stats = {}
+
+    async def call(self, name, request, deadline=None, attempt_timeout=None):
+        # request takes the seconds this attempt may run; deadline is an absolute loop.time() budget
+        loop = asyncio.get_running_loop()
+        stats = self.stats.setdefault(name, {'calls': 0, 'attempts': 0, 'timeouts': 0, 'failures': 0})
+        stats['calls'] += 1
+        attempt = 0
+        while True:
+            attempt += 1
+            timeout = attempt_timeout or self.attempt_timeout
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining < self.min_attempt_time:
+                    stats['failures'] += 1
+                    raise DeadlineExceeded(f"{name}: budget exhausted after {attempt - 1} attempts")
+                timeout = min(timeout, remaining)
+            stats['attempts'] += 1
+            try:
+                with metrics.timer(name):
+                    return await request(timeout)
+            except (DeadlineExceeded, StreamCutOff):
+                stats['failures'] += 1
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    stats['timeouts'] += 1
+                error = e
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1)
+            out_of_time = deadline is not None and loop.time() + delay + self.min_attempt_time > deadline
+            if attempt >= self.max_attempts or out_of_time:
+                stats['failures'] += 1
+                raise error
+            logger.warning(f"{name} attempt {attempt} failed ({type(error).__name__}: {error}), retrying in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+
+    def snapshot(self):
+        return {
+            name: dict(stats, amplification=stats['attempts'] / stats['calls'] if stats['calls'] else 0.0)
+            for name, stats in self.stats.items()
+        }
+
+retry_policy = RetryPolicy()
+
+metrics.collect('retries', lambda: (
+    (f"retry_{field}_total", {'call': name}, stats[field])
+    for name, stats in retry_policy.snapshot().items()
+    for field in ('calls', 'attempts', 'timeouts', 'failures')
+))
+
+def deadline_from(when):
+    # Converts a wall-clock datetime into a loop.time() deadline
+    remaining = (when - get_current_et_time()).total_seconds()
+    return asyncio.get_running_loop().time() + remaining
+
+def parse_game_time(game_data):
+    game_time = datetime.strptime(game_data['gameDate'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=pytz.UTC)
+    return game_time.astimezone(pytz.timezone('America/New_York'))
+
+def parse_build_id(html):
+    j = re.findall('__NEXT_DATA__" type="application/json">(.*?)</script>', html)
+    if not j:
+        return None
+    return json.loads(j[0])['buildId']
+
+def sportsbookreview_urls(sport, date, build_id):
+    league = SPORT_DICT[sport]
+    spreads_url = f"{SPORTSBOOKREVIEW_URL}/_next/data/{build_id}/betting-odds/{league}.json?league={league}&date={date}"
+    moneyline_url = f"{SPORTSBOOKREVIEW_URL}/_next/data/{build_id}/betting-odds/{league}/money-line/full-game.json?league={league}&oddsType=money-line&oddsScope=full-game&date={date}"
+    return spreads_url, moneyline_url
+
+def parse_games(spreads_json, moneyline_json, current_line=True):
+    _line = 'currentLine' if current_line else 'openingLine'
+
+    spreads_list = spreads_json['pageProps']['oddsTables'][0]['oddsTableModel']['gameRows']
+    spreads = {g['gameView']['gameId']: g for g in spreads_list}
+    moneylines_list = moneyline_json['pageProps']['oddsTables'][0]['oddsTableModel']['gameRows']
+    moneylines = {g['gameView']['gameId']: g for g in moneylines_list}
+
+    all_stats = {
+        game_id: {'spreads': spreads[game_id], 'moneylines': moneylines[game_id]} for game_id in spreads.keys()
+    }
+
+    games = []
+    for event in all_stats.values():
+        game = {}
+        game['date'] = event['spreads']['gameView']['startDate']
+        game['home_team'] = event['spreads']['gameView']['homeTeam']['fullName']
+        game['away_team'] = event['spreads']['gameView']['awayTeam']['fullName']
+        game['id'] = f"{game['date']}_{game['away_team']}_{game['home_team']}"
+        game['home_ml'] = {}
+        game['away_ml'] = {}
+        if 'moneylines' in event and 'oddsViews' in event['moneylines'] and event['moneylines']['oddsViews']:
+            for line in event['moneylines']['oddsViews']:
+                if not line:
+                    continue
+                game['home_ml'][line['sportsbook']] = line[_line]['homeOdds']
+                game['away_ml'][line['sportsbook']] = line[_line]['awayOdds']
+        games.append(game)
+    return games
+
+class StaleBuildId(Exception):
+    pass
+
+_sportsbookreview_build_id = None  # Next.js buildId shared by every scrape until the site redeploys
+_build_id_lock = None
+
+def build_id_lock():
+    # Created per event loop; asyncio.Lock binds to the loop it is first contended on
+    global _build_id_lock
+    loop = asyncio.get_running_loop()
+    if _build_id_lock is None or _build_id_lock[0] is not loop:
+        _build_id_lock = (loop, asyncio.Lock())
+    return _build_id_lock[1]
+
+class AsyncScrapeSportsbookreview:
+    def __init__(self, sport='MLB', date="", current_line=True):
+        self.sport = sport
+        self.date = date
+        self.current_line = current_line
+        self.games = []
+
+    async def _get(self, session, url, as_json):
+        start_time = time.time()
+        async with session.get(url) as response:
+            # An old buildId 404s once the site redeploys
+            if as_json and response.status == 404:
+                raise StaleBuildId(url)
+            response.raise_for_status()
+            payload = await response.json(content_type=None) if as_json else await response.text()
+        elapsed_time = time.time() - start_time
+        logger.info(f"API call to {url} took {elapsed_time:.2f} seconds")
+        if as_json and 'pageProps' not in payload:
+            raise StaleBuildId(url)
+        return payload
+
+    async def build_id(self, session, stale=None):
+        # Concurrent scrapes that hit the same stale id refresh it once: the rest wait and re-check
+        global _sportsbookreview_build_id
+        if _sportsbookreview_build_id is not None and _sportsbookreview_build_id != stale:
+            return _sportsbookreview_build_id
+        async with build_id_lock():
+            if _sportsbookreview_build_id is None or _sportsbookreview_build_id == stale:
+                date = self.date or datetime.today().strftime("%Y-%m-%d")
+                html = await self._get(session, f"{SPORTSBOOKREVIEW_URL}/betting-odds/{SPORT_DICT[self.sport]}/?date={date}", as_json=False)
+                _sportsbookreview_build_id = parse_build_id(html)
+                metrics.inc('sportsbookreview_build_id_fetches_total')
+                logger.info(f"Sportsbook Review buildId is {_sportsbookreview_build_id}")
+        return _sportsbookreview_build_id
+
+    async def _get_tables(self, session, date, build_id):
+        spreads_url, moneyline_url = sportsbookreview_urls(self.sport, date, build_id)
+        return await asyncio.gather(
+            self._get(session, spreads_url, as_json=True),
+            self._get(session, moneyline_url, as_json=True)
+        )
+
+    async def scrape_games(self, deadline=None):
+        return await retry_policy.call(
+            'scrape', lambda timeout: asyncio.wait_for(self._scrape(), timeout), deadline, attempt_timeout=60
+        )
+
+    async def _scrape(self):
+        sport = self.sport
+        date = self.date or datetime.today().strftime("%Y-%m-%d")
+
+        try:
+            session = await get_http_session()
+            # The landing page is only fetched for a buildId on first use and after a redeploy
+            build_id = await self.build_id(session)
+            if build_id is not None:
+                try:
+                    spreads_json, moneyline_json = await self._get_tables(session, date, build_id)
+                except StaleBuildId:
+                    logger.info(f"Sportsbook Review buildId {build_id} is stale, refreshing")
+                    build_id = await self.build_id(session, stale=build_id)
+                    if build_id is not None:
+                        spreads_json, moneyline_json = await self._get_tables(session, date, build_id)
+            if build_id is None:
+                logger.warning(f"No data found for {sport} on {date}")
+                self.games = []
+                return self.games
+
+            self.games = parse_games(spreads_json, moneyline_json, self.current_line)
+            return self.games
+        except aiohttp.ClientError as e:
             logger.error(f"Error scraping data for {sport} on {date}: {e}")
             raise
 
+TEAM_NICKNAMES = {
+    'diamondbacks': 'diamondbacks', 'd-backs': 'diamondbacks', 'dbacks': 'diamondbacks',
+    'braves': 'braves', 'orioles': 'orioles', 'red sox': 'red sox', 'cubs': 'cubs',
+    'white sox': 'white sox', 'reds': 'reds', 'guardians': 'guardians', 'indians': 'guardians',
+    'rockies': 'rockies', 'tigers': 'tigers', 'astros': 'astros', 'royals': 'royals',
+    'angels': 'angels', 'dodgers': 'dodgers', 'marlins': 'marlins', 'brewers': 'brewers',
+    'twins': 'twins', 'mets': 'mets', 'yankees': 'yankees', 'athletics': 'athletics', "a's": 'athletics',
+    'phillies': 'phillies', 'pirates': 'pirates', 'padres': 'padres', 'giants': 'giants',
+    'mariners': 'mariners', 'cardinals': 'cardinals', 'rays': 'rays', 'rangers': 'rangers',
+    'blue jays': 'blue jays', 'nationals': 'nationals',
+}
+_NICKNAMES_LONGEST_FIRST = sorted(TEAM_NICKNAMES, key=len, reverse=True)
+
+def normalize_team(name):
+    # Sportsbook Review and the MLB Stats API disagree on city prefixes and short names
+    cleaned = ' '.join(re.sub(r"[^a-z0-9' -]", ' ', name.lower()).split())
+    for nickname in _NICKNAMES_LONGEST_FIRST:
+        if cleaned.endswith(nickname):
+            return TEAM_NICKNAMES[nickname]
+    return cleaned
+
+def parse_iso_datetime(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def build_odds_join(schedule_games, slate, max_offset=timedelta(hours=6)):
+    rows_by_matchup = {}
+    for row in slate:
+        key = (normalize_team(row['away_team']), normalize_team(row['home_team']))
+        rows_by_matchup.setdefault(key, []).append((parse_iso_datetime(row['date']), row))
+
+    join = {}
+    unmatched = []
+    for game in sorted(schedule_games, key=lambda g: g['game_time']):
+        key = (normalize_team(game['away_team']), normalize_team(game['home_team']))
+        candidates = rows_by_matchup.get(key, [])
+        # Doubleheaders share a matchup, so take the closest remaining start time
+        best = min(candidates, key=lambda c: abs(c[0] - game['game_time']), default=None)
+        if best is None or abs(best[0] - game['game_time']) > max_offset:
+            unmatched.append(game['id'])
+            continue
+        candidates.remove(best)
+        join[game['id']] = best[1]
+    return join, unmatched
+
+def american_to_implied(prices):
+    prices = np.asarray(prices, dtype=float)
+    # np.where evaluates both branches, so +100 divides by zero in the branch it then discards
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(prices > 0, 100 / (prices + 100), -prices / (100 - prices))
+
+ODDS_SIDES = ('home', 'away')
+
+VALUE_BET_MIN_EV = 0.02  # Expected return per unit staked before a forecast's pick is flagged as a value bet
+
+def slate_prices(rows):
+    # (game, side, sportsbook) array of American prices; books a game isn't offered at stay NaN
+    books = sorted({book for row in rows for side in ODDS_SIDES for book in row[f"{side}_ml"]})
+    column = {book: i for i, book in enumerate(books)}
+    prices = np.full((len(rows), len(ODDS_SIDES), max(len(books), 1)), np.nan)
+    for g, row in enumerate(rows):
+        for s, side in enumerate(ODDS_SIDES):
+            for book, price in row[f"{side}_ml"].items():
+                if price:
+                    prices[g, s, column[book]] = price
+    return prices, books
+
+def analyze_slate(rows):
+    # One pass over the whole slate: implied probabilities, vig, the no-vig consensus and the best price per side
+    prices, books = slate_prices(rows)
+    implied = american_to_implied(prices)
+    overround = implied.sum(axis=1)  # NaN unless the book prices both sides
+    fair = implied / overround[:, np.newaxis]
+    two_sided = np.isfinite(overround)
+    consensus = np.ma.median(np.ma.masked_invalid(fair), axis=2).filled(np.nan)
+    consensus = consensus / consensus.sum(axis=1, keepdims=True)
+    vig = np.ma.median(np.ma.masked_invalid(overround - 1), axis=1).filled(np.nan)
+    decimal = np.nan_to_num(1 / implied, nan=0.0)
+    best_book = decimal.argmax(axis=2)
+    best_decimal = np.take_along_axis(decimal, best_book[..., np.newaxis], axis=2)[..., 0]
+    return {
+        'books': books,
+        'prices': prices,
+        'n_books': two_sided.sum(axis=1),
+        'vig': vig,
+        'fair': consensus,
+        'best_decimal': np.where(best_decimal > 0, best_decimal, np.nan),
+        'best_book': best_book,
+    }
+
+def game_analytics(analytics, g):
+    if not analytics['n_books'][g]:
+        return None
+    summary = {'books': int(analytics['n_books'][g]), 'vig': float(analytics['vig'][g])}
+    for s, side in enumerate(ODDS_SIDES):
+        best_decimal = analytics['best_decimal'][g, s]
+        fair = analytics['fair'][g, s]
+        summary[side] = {
+            'fair_probability': float(fair),
+            'fair_line': decimal_to_american(1 / fair),
+            'best_price': decimal_to_american(best_decimal),
+            'best_book': analytics['books'][analytics['best_book'][g, s]],
+            'best_decimal': float(best_decimal),
+        }
+    return summary
+
+def expected_value(probability, decimal_odds):
+    return probability * decimal_odds - 1
+
+def value_bet(analytics, side, probability, min_ev=VALUE_BET_MIN_EV):
+    # Forecast probability for the picked side against the best price on offer and the no-vig consensus
+    if analytics is None or side not in ODDS_SIDES or probability is None:
+        return None
+    line = analytics[side]
+    ev = expected_value(probability, line['best_decimal'])
+    return {
+        'side': side,
+        'probability': probability,
+        'fair_probability': line['fair_probability'],
+        'edge': probability - line['fair_probability'],
+        'best_price': line['best_price'],
+        'best_book': line['best_book'],
+        'ev': ev,
+        'flag': ev >= min_ev,
+    }
+
+ODDS_HISTORY_DAYS_IN_MEMORY = 2
+ODDS_HISTORY_FLUSH_INTERVAL = 600  # Seconds between writes of the in-memory odds history to disk
+
+class OddsPartition:
+    def __init__(self, date):
+        self.date = date
+        self.games = []
+        self.game_index = {}
+        self.books = []
+        self.book_index = {}
+        # One row per observed price change: 12 bytes per (timestamp, game, sportsbook, side) observation
+        self.timestamps = array('I')
+        self.game = array('H')
+        self.book = array('B')
+        self.side = array('B')
+        self.price = array('h')
+        self.previous = array('h')
+        self.last = {}
+        self.saved = False
+
+    def _intern(self, values, index, value):
+        if value not in index:
+            index[value] = len(values)
+            values.append(value)
+        return index[value]
+
+    def append(self, timestamp, game_id, book, side, price):
+        g = self._intern(self.games, self.game_index, str(game_id))
+        b = self._intern(self.books, self.book_index, book)
+        key = (g, b, side)
+        previous = self.last.get(key)
+        if previous == price:
+            return False
+        self.last[key] = price
+        self.saved = False
+        self.timestamps.append(timestamp)
+        self.game.append(g)
+        self.book.append(b)
+        self.side.append(side)
+        self.price.append(price)
+        self.previous.append(price if previous is None else previous)
+        return True
+
+    def columns(self):
+        return {
+            'timestamps': np.array(self.timestamps, dtype=np.uint32),
+            'game': np.array(self.game, dtype=np.uint16),
+            'book': np.array(self.book, dtype=np.uint8),
+            'side': np.array(self.side, dtype=np.uint8),
+            'price': np.array(self.price, dtype=np.int16),
+            'previous': np.array(self.previous, dtype=np.int16),
+        }
+
+    def save(self, path):
+        np.savez_compressed(path, games=np.array(self.games), books=np.array(self.books), **self.columns())
+        self.saved = True
+
+    @classmethod
+    def load(cls, date, path):
+        partition = cls(date)
+        with np.load(path) as data:
+            for game_id in data['games']:
+                partition._intern(partition.games, partition.game_index, str(game_id))
+            for book in data['books']:
+                partition._intern(partition.books, partition.book_index, str(book))
+            partition.timestamps.extend(data['timestamps'].tolist())
+            partition.game.extend(data['game'].tolist())
+            partition.book.extend(data['book'].tolist())
+            partition.side.extend(data['side'].tolist())
+            partition.price.extend(data['price'].tolist())
+            partition.previous.extend(data['previous'].tolist())
+        for g, b, side, price in zip(partition.game, partition.book, partition.side, partition.price):
+            partition.last[(g, b, side)] = price
+        partition.saved = True
+        return partition
+
+    def line(self, game_id, opening):
+        g = self.game_index.get(str(game_id))
+        line = {side: {} for side in ODDS_SIDES}
+        if g is None:
+            return line
+        cols = self.columns()
+        rows = np.nonzero(cols['game'] == g)[0]
+        if not opening:
+            rows = rows[::-1]
+        # First occurrence of each (sportsbook, side) in time order, or reverse time order for the current line
+        keys = cols['book'][rows].astype(np.int32) * 2 + cols['side'][rows]
+        _, first = np.unique(keys, return_index=True)
+        for row in rows[first]:
+            line[ODDS_SIDES[cols['side'][row]]][self.books[cols['book'][row]]] = int(cols['price'][row])
+        return line
+
+    def steam_moves(self, since, min_books):
+        cols = self.columns()
+        moved = (cols['timestamps'] >= since) & (cols['price'] != cols['previous'])
+        if not moved.any():
+            return []
+        delta = american_to_implied(cols['price'][moved]) - american_to_implied(cols['previous'][moved])
+        game_side = cols['game'][moved].astype(np.int64) * 2 + cols['side'][moved]
+        book = cols['book'][moved].astype(np.int64)
+        # A steam move is several books shortening the same side inside the window
+        shortened = delta > 0
+        pairs = np.unique(game_side[shortened] * 256 + book[shortened])
+        books_moved = np.bincount(pairs // 256, minlength=len(self.games) * 2)
+        total_move = np.bincount(game_side, weights=delta, minlength=len(self.games) * 2)
+        moves = []
+        for key in np.nonzero(books_moved >= min_books)[0]:
+            moves.append({
+                'game_id': self.games[key // 2],
+                'side': ODDS_SIDES[key % 2],
+                'books_moved': int(books_moved[key]),
+                'implied_move': float(total_move[key] / books_moved[key]),
+            })
+        return moves
+
+class OddsHistory:
+    def __init__(self, directory=None, days_in_memory=ODDS_HISTORY_DAYS_IN_MEMORY):
+        self.directory = directory
+        self.days_in_memory = days_in_memory
+        self.partitions = {}
+        self.game_dates = {}
+        if directory:
+            ensure_directory(directory)
+
+    def _path(self, date):
+        return os.path.join(self.directory, f"{date}.npz")
+
+    def _save(self, date, partition):
+        if self.directory and not partition.saved:
+            partition.save(self._path(date))
+            logger.info(f"Flushed odds history for {date} to {self._path(date)}")
+
+    def _evict(self):
+        # Only the most recent days stay in memory; older ones are written out or dropped
+        for date in sorted(self.partitions)[:-self.days_in_memory]:
+            self._save(date, self.partitions.pop(date))
+
+    def flush(self):
+        for date, partition in self.partitions.items():
+            self._save(date, partition)
+
+    def partition(self, date, create=False):
+        if date in self.partitions:
+            return self.partitions[date]
+        if self.directory and os.path.exists(self._path(date)):
+            partition = OddsPartition.load(date, self._path(date))
+        elif create:
+            partition = OddsPartition(date)
+        else:
+            return None
+        self.partitions[date] = partition
+        self._evict()
+        return partition
+
+    def record(self, odds_by_game, recorded_at, date=None):
+        # Partitions are keyed by the slate's game date, which a backfill sets to a past day
+        date = date or recorded_at.strftime('%Y-%m-%d')
+        partition = self.partition(date, create=True)
+        timestamp = int(recorded_at.timestamp())
+        changes = 0
+        for game_id, row in odds_by_game.items():
+            self.game_dates[str(game_id)] = date
+            for side_index, side in enumerate(ODDS_SIDES):
+                for book, price in row[f"{side}_ml"].items():
+                    if price is None:
+                        continue
+                    changes += partition.append(timestamp, game_id, book, side_index, int(price))
+        return changes
+
+    def _line(self, game_id, opening):
+        date = self.game_dates.get(str(game_id))
+        partition = self.partition(date) if date else None
+        return partition.line(game_id, opening) if partition else {side: {} for side in ODDS_SIDES}
+
+    def opening_line(self, game_id):
+        return self._line(game_id, opening=True)
+
+    def current_line(self, game_id):
+        return self._line(game_id, opening=False)
+
+    def steam_moves(self, minutes=30, min_books=3, now=None, date=None):
+        now = now or get_current_et_time()
+        partition = self.partition(date or now.strftime('%Y-%m-%d'))
+        if partition is None:
+            return []
+        return partition.steam_moves(int(now.timestamp()) - minutes * 60, min_books)
+
+ODDS_REFRESH_TTL = 300  # Seconds a slate scrape is reused before Sportsbook Review is hit again
+
 class OddsCache:
-    def __init__(self):
+    def __init__(self, refresh_ttl=ODDS_REFRESH_TTL, history=None, game_date=None):
+        self.game_date = game_date  # None follows the current ET date
         self.odds = {}
+        self.history = history or OddsHistory()
+        self.slate = []
+        self.schedule = []
+        self.unmatched = []
+        self.analytics = {}
+        self.steam = {}
         self.last_full_scrape = None
+        self.refresh_ttl = refresh_ttl
+        self._refresh_lock = asyncio.Lock()
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=60))
     async def daily_scrape(self):
         logger.info("Starting daily odds scrape")
         start_time = time.time()
-        games = await fetch_today_games()
+        games = await (fetch_games(self.game_date) if self.game_date else fetch_today_games())
         elapsed_time = time.time() - start_time
-        logger.info(f"Fetching today's games took {elapsed_time:.2f} seconds")
+        logger.info(f"Fetching the schedule took {elapsed_time:.2f} seconds")
         
-        date = datetime.now(pytz.timezone('America/New_York')).strftime("%Y-%m-%d")
-        scraper = ScrapeSportsbookreview(sport="MLB", date=date)
-        self.odds = {game['id']: self.format_odds(game) for game in scraper.games}
-        self.last_full_scrape = datetime.now(pytz.timezone('America/New_York'))
+        self.schedule = games
+        await self.refresh_slate(force=True)
         logger.info("Completed daily odds scrape")
 
-    def format_odds(self, game):
+    def set_schedule(self, games):
+        self.schedule = games
+        if self.last_full_scrape is not None:
+            self.rebuild_join(self.last_full_scrape)
+
+    def rebuild_join(self, scraped_at):
+        join, self.unmatched = build_odds_join(self.schedule, self.slate)
+        self.odds = {
+            game_id: self.format_odds(row, scraped_at, self.odds.get(game_id, {}).get('initial_odds'))
+            for game_id, row in join.items()
+        }
+        analytics = analyze_slate(list(join.values()))
+        self.analytics = {game_id: game_analytics(analytics, g) for g, game_id in enumerate(join)}
+        if self.unmatched:
+            logger.warning(f"{len(self.unmatched)} of {len(self.schedule)} scheduled games have no Sportsbook Review odds: {self.unmatched}")
+
+    def is_fresh(self):
+        if self.last_full_scrape is None:
+            return False
+        age = (get_current_et_time() - self.last_full_scrape).total_seconds()
+        return age < self.refresh_ttl
+
+    async def refresh_slate(self, force=False):
+        if not force and self.is_fresh():
+            return self.slate
+        async with self._refresh_lock:
+            # Callers that queued behind an in-flight refresh reuse its result
+            if not force and self.is_fresh():
+                return self.slate
+            await self.scrape_slate()
+        return self.slate
+
+    async def scrape_slate(self):
+        date = self.game_date or get_current_et_time().strftime("%Y-%m-%d")
+        scraper = AsyncScrapeSportsbookreview(sport="MLB", date=date)
+        await scraper.scrape_games()
+        scraped_at = get_current_et_time()
+        self.slate = scraper.games
+        self.rebuild_join(scraped_at)
+        changes = self.history.record(
+            {game_id: odds['latest_odds'] for game_id, odds in self.odds.items()}, scraped_at, self.game_date
+        )
+        logger.info(f"Recorded {changes} line changes in odds history")
+        self.steam = {(str(move['game_id']), move['side']): move for move in self.history.steam_moves(now=scraped_at, date=self.game_date)}
+        if self.steam:
+            logger.info(f"Steam moves in the last 30 minutes: {list(self.steam.values())}")
+        self.last_full_scrape = scraped_at
+        logger.info(f"Refreshed odds slate with {len(self.slate)} games, {len(self.odds)} joined to the schedule")
+
+    def format_odds(self, game, scraped_at=None, initial_odds=None):
         return {
-            'initial_odds': game,
+            'initial_odds': initial_odds or game,
             'latest_odds': game,
-            'last_updated': datetime.now(pytz.timezone('America/New_York'))
+            'last_updated': scraped_at or get_current_et_time()
         }
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=60))
     async def update_game_odds(self, game_id, away_team, home_team):
-        date = datetime.now(pytz.timezone('America/New_York')).strftime("%Y-%m-%d")
-        scraper = ScrapeSportsbookreview(sport="MLB", date=date)
-        for game in scraper.games:
-            if game['home_team'] == home_team and game['away_team'] == away_team:
-                self.odds[game_id] = self.format_odds(game)
-                logger.info(f"Updated odds for game {game_id}")
-                return
-        logger.warning(f"Failed to update odds for game {game_id}. Game not found.")
+        await self.refresh_slate()
+        if game_id in self.odds:
+            logger.info(f"Odds for game {game_id} current as of {self.odds[game_id]['last_updated'].strftime('%H:%M:%S')}")
+        else:
+            logger.warning(f"Failed to update odds for game {game_id} ({away_team} vs {home_team}). Game not found.")
 
     def get_odds(self, game_id):
         return self.odds.get(game_id, {}).get('latest_odds')
 
+    def get_analytics(self, game_id):
+        return self.analytics.get(game_id)
+
+    def line_movement(self, game_id):
+        opening = self.history.opening_line(game_id)
+        current = self.history.current_line(game_id)
+        return {
+            side: {
+                'open': consensus_moneyline(opening[side].values()),
+                'current': consensus_moneyline(current[side].values()),
+                'steam': self.steam.get((str(game_id), side)),
+            }
+            for side in ODDS_SIDES
+        }
+
+CHAT_MODELS = ["gpt-4o", "meta-llama/Meta-Llama-3-70B-Instruct", "claude-3-5-sonnet-20240620"]
+FORECAST_MODELS = ["claude-3-5-sonnet-20240620", "gpt-4o"]
+
+def prediction_models():
+    return CHAT_MODELS + [f"{m}_forecast" for m in FORECAST_MODELS]
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mlb_data')
+
 def get_current_et_time():
     return datetime.now(pytz.timezone('America/New_York'))
 
@@ -167,40 +911,171 @@ class DateTimeEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super(DateTimeEncoder, self).default(obj)
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=60))
-async def fetch_today_games():
-    current_time = get_current_et_time()
-    today = current_time.strftime('%Y-%m-%d')
-    
-    url = f"http://statsapi.mlb.com/api/v1/schedule/games/?sportId=1&startDate={today}&endDate={today}"
-    
+SCHEDULE_FIELDS = ("dates,date,games,gamePk,gameDate,officialDate,status,abstractGameState,detailedState,"
+                   "teams,away,home,team,name")
+
+async def fetch_today_games(deadline=None):
+    return await fetch_games(get_current_et_time().strftime('%Y-%m-%d'), deadline)
+
+async def fetch_games(game_date, deadline=None):
+    schedule_data, _, _ = await fetch_schedule(game_date, deadline)
+    return [schedule_game(game) for date in schedule_data['dates'] for game in date['games']]
+
+async def fetch_schedule(game_date, deadline=None, etag=None):
+    # Returns (payload, etag, digest); the payload is None when the server answers 304 Not Modified
+    url = (f"{MLB_STATS_API_URL}/schedule/games/?sportId=1&startDate={game_date}&endDate={game_date}"
+           f"&fields={SCHEDULE_FIELDS}")
+
+    async def fetch():
+        session = await get_http_session()
+        headers = {'If-None-Match': etag} if etag else {}
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304:
+                return None, etag, None
+            response.raise_for_status()
+            body = await response.read()
+            return json.loads(body), response.headers.get('ETag'), hashlib.sha256(body).hexdigest()
+
     start_time = time.time()
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            schedule_data = await response.json()
+    result = await retry_policy.call(
+        'schedule', lambda timeout: asyncio.wait_for(fetch(), timeout), deadline, attempt_timeout=60
+    )
     elapsed_time = time.time() - start_time
-    logger.info(f"API call to fetch today's games took {elapsed_time:.2f} seconds")
-    
-    games = []
-    for date in schedule_data['dates']:
-        for game in date['games']:
-            away_team = game['teams']['away']['team']['name']
-            home_team = game['teams']['home']['team']['name']
-            game_time = datetime.strptime(game['gameDate'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=pytz.UTC)
-            game_time_et = game_time.astimezone(pytz.timezone('America/New_York'))
-            games.append({
-                'id': game['gamePk'],
-                'away_team': away_team,
-                'home_team': home_team,
-                'game_time': game_time_et,
-                'game_data': game
-            })
-    return games
+    logger.info(f"API call to fetch games for {game_date} took {elapsed_time:.2f} seconds")
+    return result
+
+def schedule_game(game):
+    return {
+        'id': game['gamePk'],
+        'away_team': game['teams']['away']['team']['name'],
+        'home_team': game['teams']['home']['team']['name'],
+        'game_time': parse_game_time(game),
+        'game_data': game
+    }
+
+def is_unplayed(game):
+    return game['game_data'].get('status', {}).get('detailedState') in UNPLAYED_STATES
+
+class ScheduleSync:
+    def __init__(self):
+        self.date = None
+        self.games = {}
+        self.etag = None
+        self.digest = None
+        self.counts = {'refreshes': 0, 'not_modified': 0, 'unchanged': 0}
+
+    def list(self):
+        return sorted(self.games.values(), key=lambda game: (game['game_time'], game['id']))
+
+    async def refresh(self, game_date=None, deadline=None):
+        game_date = game_date or get_current_et_time().strftime('%Y-%m-%d')
+        same_day = game_date == self.date
+        self.counts['refreshes'] += 1
+        schedule_data, etag, digest = await fetch_schedule(game_date, deadline, self.etag if same_day else None)
+        if schedule_data is None:
+            self.counts['not_modified'] += 1
+            return []
+        if same_day and digest == self.digest:
+            # Byte-identical payload from a server that ignores If-None-Match
+            self.counts['unchanged'] += 1
+            return []
+        events = self.diff([game for date in schedule_data['dates'] for game in date['games']])
+        self.date, self.etag, self.digest = game_date, etag, digest
+        if events:
+            logger.info(f"Schedule for {game_date}: " + ", ".join(
+                f"{kind} {sum(1 for event in events if event['type'] == kind)}"
+                for kind in dict.fromkeys(event['type'] for event in events)
+            ))
+        return events
+
+    def diff(self, raw_games):
+        events = []
+        current = {}
+        for raw in raw_games:
+            previous = self.games.get(raw['gamePk'])
+            if previous is not None and previous['game_data'] == raw:
+                # Unchanged games keep their parsed entry and produce no event
+                current[raw['gamePk']] = previous
+                continue
+            game = schedule_game(raw)
+            current[game['id']] = game
+            if previous is None:
+                kind = 'new'
+            elif is_unplayed(game) and not is_unplayed(previous):
+                kind = 'postponed'
+            elif previous['game_time'] != game['game_time']:
+                kind = 'time_change'
+            elif raw.get('status') != previous['game_data'].get('status'):
+                kind = 'status_change'
+            else:
+                kind = 'updated'
+            events.append({'type': kind, 'game': game, 'previous': previous})
+        for game_id, previous in self.games.items():
+            if game_id not in current:
+                events.append({'type': 'removed', 'game': previous, 'previous': previous})
+        self.games = current
+        return events
+
+PICK_PATTERN = re.compile(r"my prediction is:?\s*(.*)", re.IGNORECASE)
+CONFIDENCE_PATTERN = re.compile(r"confidence(?:\s+level)?[^a-z]{0,10}(?:is\s+)?\W*(low|medium|high)", re.IGNORECASE)
+
+def team_aliases(team):
+    nickname = normalize_team(team)
+    return {team.lower(), nickname} | {alias for alias, canonical in TEAM_NICKNAMES.items() if canonical == nickname}
+
+def extract_pick(text, home_team, away_team):
+    if not text:
+        return None
+    match = PICK_PATTERN.search(text)
+    snippet = (match.group(1) if match else text)[:300].lower()
+    # The team named first after "My prediction is:" (or first in a forecast) is the pick
+    positions = {}
+    for team in (home_team, away_team):
+        found = [m.start() for m in (re.search(r"\b" + re.escape(alias) + r"\b", snippet) for alias in team_aliases(team)) if m]
+        if found:
+            positions[team] = min(found)
+    return min(positions, key=positions.get) if positions else None
+
+def extract_confidence(text):
+    match = CONFIDENCE_PATTERN.search(text or "")
+    return match.group(1).lower() if match else None
+
+def american_to_decimal(price):
+    return 1 + (price / 100 if price > 0 else 100 / -price)
+
+def decimal_to_american(decimal_odds):
+    return round((decimal_odds - 1) * 100) if decimal_odds >= 2 else round(-100 / (decimal_odds - 1))
 
-def construct_query(game_description, odds_info_str, is_forecast):
+def format_market(analytics, home_team, away_team, movement=None):
+    if analytics is None:
+        return "Odds data unavailable"
+    lines = [f"Moneyline across {analytics['books']} sportsbooks (median bookmaker margin {analytics['vig']:.1%}):"]
+    for side, team in (('home', home_team), ('away', away_team)):
+        line = analytics[side]
+        lines.append(f"{team}: best {line['best_price']:+d} ({line['best_book']}), "
+                     f"no-vig consensus {line['fair_line']:+d} ({line['fair_probability']:.1%} win probability)")
+    for side, team in (('home', home_team), ('away', away_team)):
+        move = (movement or {}).get(side)
+        if move and move['open'] and move['current'] and move['open'] != move['current']:
+            lines.append(f"{team} opened at {move['open']:+d} (consensus), now {move['current']:+d}")
+        if move and move['steam']:
+            lines.append(f"{team}: {move['steam']['books_moved']} sportsbooks shortened this side in the last 30 minutes")
+    return "\n".join(lines) + "\n"
+
+def consensus_moneyline(prices):
+    # Median through decimal odds so -105/+105 style lines don't straddle the sign flip
+    decimals = sorted(american_to_decimal(p) for p in prices if p)
+    if not decimals:
+        return None
+    middle = len(decimals) // 2
+    median = decimals[middle] if len(decimals) % 2 else (decimals[middle - 1] + decimals[middle]) / 2
+    return decimal_to_american(median)
+
+def construct_query(game_description, odds_info_str, is_forecast, research_context=None):
     if is_forecast:
         return f"Can you predict the winner for the upcoming game of {game_description}?"
     else:
+        research_str = f"Recent news about this matchup:\n{research_context}\n\n" if research_context else ""
         return (f"Analyze the upcoming MLB game: {game_description}. As a sports betting expert, provide a methodical analysis considering:\n"
                 f"1. Recent team performance (last 10-15 games)\n"
                 f"2. Starting pitchers' stats (ERA, WHIP, recent form)\n"
@@ -220,6 +1095,7 @@ def construct_query(game_description, odds_info_str, is_forecast):
                 f"15. Stolen base success rates vs. catcher throw-out percentages\n"
                 f"16. Performance in high-leverage situations\n"
                 f"17. Motivational factors (playoff race, rivalries, etc.)\n\n"
+                f"{research_str}"
                 f"Current odds:\n{odds_info_str}\n\n"
                 f"Based on this analysis:\n"
                 f"1. Provide an absolute recommendation at the beginning, using the phrase 'My prediction is:'\n"
@@ -229,49 +1105,459 @@ def construct_query(game_description, odds_info_str, is_forecast):
                 f"5. Identify any potential upset scenarios or undervalued bets.\n\n"
                 f"Keep the total response under 1990 characters.")
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=60))
-async def process_game(game_data, odds_cache, base_directory, model, is_forecast=False):
+RATE_BUDGETS = {
+    # Per-model (requests per minute, burst) for each AskNews endpoint
+    'forecast': (6, 2),
+    'chat': (20, 5),
+    'news': (30, 5),
+}
+
+def is_rate_limited(error):
+    # asknews_sdk raises these for 429 responses; they carry no HTTP status attribute
+    return type(error).__name__ in ('RateLimitExceededError', 'ConcurrencyLimitExceededError')
+
+async def wait_for_grant(future, deadline, min_remaining, give_back):
+    # Waits on a deadline-ordered heap entry; False means the deadline came first and the entry was withdrawn
+    loop = asyncio.get_running_loop()
+    try:
+        if deadline is None:
+            await future
+            return True
+        await asyncio.wait({future}, timeout=deadline - min_remaining - loop.time())
+    except BaseException:
+        if future.done() and not future.cancelled():
+            give_back()
+        future.cancel()
+        raise
+    if not future.done():
+        future.cancel()
+        return False
+    return True
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._waiters = []  # (deadline, seq, future); each refilled token goes to the earliest deadline
+        self._counter = itertools.count()
+        self._timer = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _grant(self):
+        self._timer = None
+        self._refill()
+        while self._waiters and (self.tokens >= 1 or self._waiters[0][2].done()):
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # Expired or cancelled while waiting
+            self.tokens -= 1
+            future.set_result(None)
+        if self._waiters:
+            self._timer = asyncio.get_running_loop().call_later((1 - self.tokens) / self.rate, self._grant)
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    async def acquire(self, deadline=None, min_remaining=0):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (math.inf if deadline is None else deadline, next(self._counter), future))
+        if self._timer is None:
+            self._grant()
+        return await wait_for_grant(future, deadline, min_remaining, self.refund)
+
+class AdaptiveLimiter:
+    def __init__(self, budgets=RATE_BUDGETS, initial=5, minimum=1, maximum=10, min_remaining=5):
+        self.budgets = budgets
+        self.window = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.min_remaining = min_remaining  # A waiter with less time than this before its deadline is dropped
+        self.in_flight = 0
+        self.waiting = 0
+        self.buckets = {}
+        self.counts = {'acquired': 0, 'throttled': 0, 'timeouts': 0, 'expired': 0}
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._queue = []  # (deadline, seq, future); the earliest deadline gets the next free slot
+        self._counter = itertools.count()
+
+    def bucket(self, endpoint, model):
+        key = (endpoint, model)
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(*self.budgets[endpoint])
+        return self.buckets[key]
+
+    def on_success(self):
+        # Additive increase: roughly one extra slot per window's worth of successes
+        self.window = min(self.maximum, self.window + 1 / self.window)
+
+    def on_throttle(self, reason):
+        self.counts[reason] += 1
+        self.window = max(self.minimum, self.window / 2)
+        logger.warning(f"AskNews {reason}, shrinking concurrency window to {int(self.window)}")
+
+    def _dispatch(self):
+        while self._queue and self.in_flight < int(self.window):
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue  # Expired or cancelled while queued
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _expire(self, reason):
+        # Dropped rather than sent: it could not finish before first pitch anyway
+        self.counts['expired'] += 1
+        metrics.inc('limiter_expired_total')
+        raise DeadlineExceeded(f"deadline passed while waiting for {reason}")
+
+    async def _enqueue(self, deadline):
+        future = asyncio.get_running_loop().create_future()
+        # Work without a deadline (backfills) queues behind everything that has one
+        heapq.heappush(self._queue, (math.inf if deadline is None else deadline, next(self._counter), future))
+        self._dispatch()
+        return await wait_for_grant(future, deadline, self.min_remaining, self._release)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, endpoint, model, deadline=None):
+        start_time = time.monotonic()
+        self.waiting += 1
+        try:
+            # Take the model's token before queueing for a slot so a throttled model never holds one;
+            # both waits hand out capacity earliest deadline first
+            bucket = self.bucket(endpoint, model)
+            if not await bucket.acquire(deadline, self.min_remaining):
+                self._expire(f"a {endpoint} token for {model}")
+            if not await self._enqueue(deadline):
+                bucket.refund()
+                self._expire("an AskNews slot")
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - start_time
+        self.counts['acquired'] += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        try:
+            yield
+        except asyncio.TimeoutError:
+            self.on_throttle('timeouts')
+            raise
+        except Exception as e:
+            if is_rate_limited(e):
+                self.on_throttle('throttled')
+            raise
+        else:
+            self.on_success()
+        finally:
+            self._release()
+
+    def snapshot(self):
+        acquired = self.counts['acquired']
+        expired = self.counts['expired']
+        return {
+            'window': int(self.window),
+            'in_flight': self.in_flight,
+            'queue_depth': self.waiting,
+            'acquired': acquired,
+            'throttled': self.counts['throttled'],
+            'timeouts': self.counts['timeouts'],
+            'expired': expired,
+            'miss_rate': expired / (acquired + expired) if acquired + expired else 0.0,
+            'avg_wait': self.wait_total / acquired if acquired else 0.0,
+            'max_wait': self.wait_max,
+        }
+
+async def call_asknews(endpoint, model, request, timeout, limiter=None, deadline=None, kept=None):
+    # kept() is true once a streamed response has stored what it needs; a failure after that is not retried
+    async def attempt(timeout):
+        try:
+            with metrics.timer('asknews', endpoint=endpoint, model=model):
+                return await asyncio.wait_for(request(), timeout)
+        except Exception as e:
+            if kept is not None and kept():
+                # Raised inside the slot as a non-timeout so the limiter doesn't treat it as throttling
+                raise StreamCutOff(f"{endpoint} {model}: {type(e).__name__} after the response was stored") from e
+            raise
+
+    if limiter is None:
+        return await attempt(timeout)
+    started = time.perf_counter()
+    async with limiter.slot(endpoint, model, deadline):
+        # Time spent queueing for a slot comes out of this attempt's allowance
+        waited = time.perf_counter() - started
+        metrics.record('asknews_wait', started, waited, endpoint=endpoint, model=model)
+        remaining = timeout - waited
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{endpoint} {model}: attempt deadline passed while queued")
+        return await attempt(remaining)
+
+RESEARCH_LOOKBACK_HOURS = 24
+RESEARCH_ARTICLES = 12
+RESEARCH_TTL = 1800  # Seconds a matchup's article set is reused across models and passes
+RESEARCH_CONTEXT_CHARS = 3000  # get_forecast sends additional_context in the query string, servers reject request lines past ~8 KB
+OWN_RETRIEVAL_ARTICLES = 1  # Chat and forecast calls always search; with shared research in the prompt keep that minimal
+FORECAST_ARTICLES = 12  # Forecast retrieval when the shared research is unavailable
+
+def trim_research(text, max_chars=RESEARCH_CONTEXT_CHARS):
+    # Keep whole articles, most relevant first, until the budget runs out
+    docs = re.findall(r"<doc>.*?</doc>", text or "", re.DOTALL) or [text or ""]
+    kept = []
+    used = 0
+    for doc in docs:
+        if used + len(doc) > max_chars:
+            if not kept:
+                kept.append(doc[:max_chars])
+            break
+        kept.append(doc)
+        used += len(doc) + 1
+    return "\n".join(kept)
+
+def chat_filter_params(research_context):
+    return {'n_articles': OWN_RETRIEVAL_ARTICLES} if research_context else None
+
+def forecast_articles(research_context):
+    return OWN_RETRIEVAL_ARTICLES if research_context else FORECAST_ARTICLES
+
+class ResearchCache:
+    def __init__(self, ttl=RESEARCH_TTL, lookback_hours=RESEARCH_LOOKBACK_HOURS, n_articles=RESEARCH_ARTICLES):
+        self.ttl = ttl
+        self.lookback_hours = lookback_hours
+        self.n_articles = n_articles
+        self._entries = {}
+        self._locks = {}
+
+    def _fresh(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and time.monotonic() - entry[0] < self.ttl
+
+    def _prune(self, keep):
+        now = time.monotonic()
+        for key in [k for k, (fetched_at, _) in self._entries.items() if k != keep and now - fetched_at >= self.ttl]:
+            del self._entries[key]
+            self._locks.pop(key, None)
+
+    async def get(self, away_team, home_team, limiter=None, deadline=None, as_of=None):
+        # as_of pins the lookback window to end at a past first pitch, searching the news archive
+        key = (f"{away_team} vs {home_team}", self.lookback_hours, as_of)
+        window = {'hours_back': self.lookback_hours}
+        if as_of is not None:
+            window = {
+                'start_timestamp': int((as_of - timedelta(hours=self.lookback_hours)).timestamp()),
+                'end_timestamp': int(as_of.timestamp()),
+                'historical': True,
+                'hours_back': None,
+            }
+        if self._fresh(key):
+            return self._entries[key][1]
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Every model for the game waits on the same retrieval
+            if self._fresh(key):
+                return self._entries[key][1]
+            start_time = time.time()
+            response = await retry_policy.call('asknews_news', lambda timeout: call_asknews(
+                'news', 'search',
+                lambda: get_sdk().news.search_news(
+                    query=f"{away_team} vs {home_team} MLB",
+                    n_articles=self.n_articles,
+                    return_type="string",
+                    method="kw",
+                    **window
+                ),
+                timeout, limiter, deadline
+            ), deadline, attempt_timeout=60)
+            elapsed_time = time.time() - start_time
+            logger.info(f"News retrieval for {key[0]} took {elapsed_time:.2f} seconds")
+            self._prune(keep=key)
+            self._entries[key] = (time.monotonic(), trim_research(response.as_string))
+        return self._entries[key][1]
+
+CHAT_STREAMING = True  # Read chat completions as they stream so the pick is stored before the rationale finishes
+
+class StreamedCompletion:
+    def __init__(self, home_team, away_team):
+        self.home_team = home_team
+        self.away_team = away_team
+        self.stored = False
+        self.reset()
+
+    def reset(self):
+        self.text = ""
+        self.pick = None
+        self.confidence = None
+        self.finished = False
+
+    def feed(self, delta):
+        self.text += delta
+        if self.pick is None:
+            match = PICK_PATTERN.search(self.text)
+            # Only read the pick once its sentence has ended, a team named later in the line could be the one picked
+            if match and ('.' in match.group(1) or match.end() < len(self.text)):
+                self.pick = extract_pick(self.text, self.home_team, self.away_team)
+        if self.confidence is None:
+            self.confidence = extract_confidence(self.text)
+
+    async def consume(self, request, on_decision):
+        # A retried attempt starts a fresh stream; a pick already stored stays until the finished response replaces it
+        self.reset()
+        stream = await request
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self.feed(chunk.choices[0].delta.content)
+                if not self.stored and self.pick is not None and self.confidence is not None:
+                    self.stored = True
+                    await on_decision(self)
+        finally:
+            await stream.aclose()
+        self.finished = True
+        return self.text
+
+    def result(self, partial=False):
+        if self.finished:
+            # Responses that never followed the "My prediction is:" format are read once they are complete
+            self.pick = self.pick or extract_pick(self.text, self.home_team, self.away_team)
+            self.confidence = self.confidence or extract_confidence(self.text)
+        result = {'response': self.text, 'pick': self.pick, 'confidence': self.confidence}
+        if partial:
+            result['partial'] = True
+        return result
+
+async def process_game(game_data, odds_cache, base_directory, model, is_forecast=False, limiter=None, deadline=None, research_context=None, response_cache=None, as_of=None):
     game_description = f"{game_data['teams']['away']['team']['name']} vs {game_data['teams']['home']['team']['name']}"
     logger.info(f"Processing game: {game_description}")
 
     odds_data = odds_cache.get_odds(game_data['gamePk'])
+    analytics = odds_cache.get_analytics(game_data['gamePk'])
+    moneyline = None
     if odds_data is None:
         logger.warning(f"No odds data available for {game_description}. Proceeding with limited information.")
         odds_info_str = "Odds data unavailable"
     else:
-        home_odds = odds_data['home_ml']
-        away_odds = odds_data['away_ml']
-        bookmakers = list(home_odds.keys())[:3]  # Use up to 3 bookmakers
-        odds_info_str = (f"Current odds from {', '.join(bookmakers)}:\n"
-                         f"{game_data['teams']['home']['team']['name']}: {', '.join([str(home_odds[b]) for b in bookmakers])}\n"
-                         f"{game_data['teams']['away']['team']['name']}: {', '.join([str(away_odds[b]) for b in bookmakers])}\n")
+        moneyline = {
+            'home': consensus_moneyline(odds_data['home_ml'].values()),
+            'away': consensus_moneyline(odds_data['away_ml'].values())
+        }
+        odds_info_str = format_market(
+            analytics, game_data['teams']['home']['team']['name'], game_data['teams']['away']['team']['name'],
+            odds_cache.line_movement(game_data['gamePk'])
+        )
 
     logger.info(f"Odds info for {game_description}: {odds_info_str}")
 
-    query = construct_query(game_description, odds_info_str, is_forecast)
+    query = construct_query(game_description, odds_info_str, is_forecast, research_context)
     logger.info(f"Constructed query for {game_description}: {query[:100]}...")  # Log first 100 chars of query
 
+    additional_context = construct_query(game_description, odds_info_str, False, research_context) if is_forecast else None
+
+    home_team = game_data['teams']['home']['team']['name']
+    away_team = game_data['teams']['away']['team']['name']
+    model_name = f"{model}_forecast" if is_forecast else model
+    game_date = parse_game_time(game_data).strftime('%Y-%m-%d')
+    # Keyed without the news text: a retrieval repeated after a restart returns different articles
+    cache_key = ResponseCache.make_key(
+        model, is_forecast, game_data['gamePk'], game_date, construct_query(game_description, odds_info_str, is_forecast),
+        odds_info_str
+    )
+
+    def prediction_data(result):
+        data = {
+            'game': game_description,
+            'game_id': game_data['gamePk'],
+            'game_datetime': parse_game_time(game_data).isoformat(),
+            'query': query,
+            'response': result['response'],
+            'home_team': home_team,
+            'away_team': away_team,
+            'odds_info': odds_info_str,
+            'moneyline': moneyline,
+        }
+        # Forecast fields, or the pick and confidence read off a streamed completion
+        data.update({key: value for key, value in result.items() if key != 'response'})
+        if data.get('probability') is not None:
+            pick = data.get('pick') or extract_pick(data['response'], home_team, away_team)
+            side = 'home' if pick == home_team else 'away' if pick == away_team else None
+            data['value'] = value_bet(analytics, side, data['probability'] / 100)
+        return data
+
     try:
-        start_time = time.time()
-        if is_forecast:
-            result = await asyncio.wait_for(
-                sdk.chat.get_forecast(
+        result = await response_cache.get(cache_key) if response_cache is not None else None
+        if result is not None:
+            logger.info(f"Serving {'forecast' if is_forecast else 'chat completion'} for {game_description} from the response cache")
+        elif is_forecast:
+            start_time = time.time()
+            forecast = await retry_policy.call('asknews_forecast', lambda timeout: call_asknews(
+                'forecast', model,
+                lambda: get_sdk().chat.get_forecast(
                     query=query,
                     model=model,
-                    web_search=True,
-                    additional_context=construct_query(game_description, odds_info_str, False),
-                    articles_to_use=12,
-                    lookback=1
+                    # The shared research already covers the matchup, and a web search can't be pinned to a past first pitch
+                    web_search=research_context is None and as_of is None,
+                    additional_context=additional_context,
+                    articles_to_use=forecast_articles(research_context),
+                    lookback=1,
+                    # Backfilled games must not see anything published after first pitch
+                    cutoff_date=as_of.astimezone(pytz.UTC).strftime('%Y-%m-%dT%H:%M:%S') if as_of else None
                 ),
-                timeout=180  # 180 second timeout
-            )
+                timeout, limiter, deadline
+            ), deadline)
             elapsed_time = time.time() - start_time
             logger.info(f"API call for forecast of {game_description} took {elapsed_time:.2f} seconds")
             logger.info(f"Successfully got forecast for {game_description}")
-            logger.info(f"Forecast result: {result.forecast[:100]}...")  # Log first 100 chars of forecast
+            logger.info(f"Forecast result: {forecast.forecast[:100]}...")  # Log first 100 chars of forecast
+            result = {
+                'response': forecast.forecast,
+                'reasoning': forecast.reasoning,
+                'probability': forecast.probability,
+                'likelihood': forecast.likelihood
+            } if forecast else None
+        elif CHAT_STREAMING:
+            start_time = time.time()
+            completion = StreamedCompletion(home_team, away_team)
+
+            async def store_decision(completion):
+                # The pick goes into the store as soon as it is readable; the finished response replaces it
+                await append_game_result(prediction_data(completion.result(partial=True)), base_directory, model_name, game_date)
+                logger.info(f"Stored early pick for {game_description} from {model}: {completion.pick} ({completion.confidence} confidence)")
+
+            try:
+                await retry_policy.call('asknews_chat', lambda timeout: call_asknews(
+                    'chat', model,
+                    lambda: completion.consume(get_sdk().chat.get_chat_completions(
+                        model=model,
+                        messages=[{"role": "user", "content": query}],
+                        stream=True,
+                        inline_citations="none",
+                        append_references=False,
+                        journalist_mode=False,
+                        asknews_watermark=False,
+                        conversational_awareness=False,
+                        filter_params=chat_filter_params(research_context)
+                    ), store_decision),
+                    timeout, limiter, deadline, kept=lambda: completion.stored
+                ), deadline)
+            except (asyncio.TimeoutError, DeadlineExceeded, StreamCutOff):
+                if not completion.stored:
+                    raise
+                logger.warning(f"Chat stream for {game_description} from {model} was cut off after the pick, keeping the partial response")
+                return prediction_data(completion.result(partial=True))
+            elapsed_time = time.time() - start_time
+            logger.info(f"Streamed chat completion of {game_description} took {elapsed_time:.2f} seconds")
+            result = completion.result() if completion.text else None
         else:
-            response = await asyncio.wait_for(
-                sdk.chat.get_chat_completions(
+            start_time = time.time()
+            response = await retry_policy.call('asknews_chat', lambda timeout: call_asknews(
+                'chat', model,
+                lambda: get_sdk().chat.get_chat_completions(
                     model=model,
                     messages=[{"role": "user", "content": query}],
                     stream=False,
@@ -279,33 +1565,23 @@ async def process_game(game_data, odds_cache, base_directory, model, is_forecast
                     append_references=False,
                     journalist_mode=False,
                     asknews_watermark=False,
-                    conversational_awareness=False
+                    conversational_awareness=False,
+                    filter_params=chat_filter_params(research_context)
                 ),
-                timeout=180  # 180 second timeout
-            )
+                timeout, limiter, deadline
+            ), deadline)
             elapsed_time = time.time() - start_time
             logger.info(f"API call for chat completion of {game_description} took {elapsed_time:.2f} seconds")
             logger.info(f"Successfully got chat completion for {game_description}")
-            result = response.choices[0].message.content if response and response.choices else None
-            logger.info(f"Chat completion result: {result[:100] if result else 'None'}...")  # Log first 100 chars of result
+            content = response.choices[0].message.content if response and response.choices else None
+            logger.info(f"Chat completion result: {content[:100] if content else 'None'}...")  # Log first 100 chars of result
+            result = {'response': content} if content else None
 
         if result:
-            data = {
-                'game': game_description,
-                'game_datetime': datetime.strptime(game_data['gameDate'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=pytz.UTC).astimezone(pytz.timezone('America/New_York')).isoformat(),
-                'query': query,
-                'response': result.forecast if is_forecast else result,
-                'home_team': game_data['teams']['home']['team']['name'],
-                'away_team': game_data['teams']['away']['team']['name'],
-                'odds_info': odds_info_str,
-            }
-            if is_forecast:
-                data.update({
-                    'reasoning': result.reasoning,
-                    'probability': result.probability,
-                    'likelihood': result.likelihood
-                })
-            await append_game_result(data, base_directory, f"{model}_forecast" if is_forecast else model)
+            if response_cache is not None:
+                await response_cache.put(cache_key, result)
+            data = prediction_data(result)
+            await append_game_result(data, base_directory, model_name, game_date)
             logger.info(f"Successfully wrote game result for {game_description}")
             return data
         else:
@@ -319,37 +1595,856 @@ async def process_game(game_data, odds_cache, base_directory, model, is_forecast
     
     return None
 
-async def append_game_result(data, base_directory, model):
-    current_date = get_current_et_time().strftime('%Y-%m-%d')
-    directory = os.path.join(base_directory, 'predictions', current_date)
-    ensure_directory(directory)
-    
-    filename = f"{model.replace('/', '_')}_predictions.json"
-    filepath = os.path.join(directory, filename)
+async def run_blocking(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args))
+
+RESPONSE_CACHE_TTL = 6 * 3600  # Seconds a successful AskNews response can be replayed
+RESPONSE_CACHE_MAX_ENTRIES = 2000
+
+class ResponseCache:
+    def __init__(self, path, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    @staticmethod
+    def make_key(model, is_forecast, game_id, game_date, prompt, odds_info):
+        # The forecast prompt carries no odds, so the odds snapshot is keyed on its own for both kinds
+        normalize = lambda text: ' '.join((text or '').split())
+        material = json.dumps([model, bool(is_forecast), str(game_id), game_date, normalize(prompt), normalize(odds_info)])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT created_at, payload FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[0] >= self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[1])
+
+    def _put(self, key, payload):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, created_at, last_access, payload) VALUES (?, ?, ?, ?)",
+                (key, now, now, json.dumps(payload, cls=DateTimeEncoder))
+            )
+            # Least recently used entries beyond the cap are evicted
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    async def get(self, key):
+        payload = await run_blocking(self._get, key)
+        if payload is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return payload
+
+    async def put(self, key, payload):
+        await run_blocking(self._put, key, payload)
+
+def iter_json_predictions(base_directory):
+    root = os.path.join(base_directory, 'predictions')
+    if not os.path.isdir(root):
+        return
+    # Files are named after the model with '/' flattened to '_'
+    model_names = {m.replace('/', '_'): m for m in prediction_models()}
+    for date_dir in sorted(os.listdir(root)):
+        directory = os.path.join(root, date_dir)
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('_predictions.json'):
+                continue
+            file_model = filename[:-len('_predictions.json')]
+            path = os.path.join(directory, filename)
+            with open(path) as f:
+                content = f.read()
+            yield date_dir, model_names.get(file_model, file_model), path, json.loads(content) if content else []
+
+class PredictionIndex:
+    def __init__(self):
+        self.date = None
+        self._keys = set()
+
+    def reset(self, date, keys=()):
+        self.date = date
+        self._keys = set(keys)
+
+    def add(self, date, game_id, model):
+        if date == self.date:
+            self._keys.add((str(game_id), model))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def has(self, game_keys, model):
+        return any((str(key), model) in self._keys for key in game_keys)
+
+    def missing(self, game_keys, models):
+        return [model for model in models if not self.has(game_keys, model)]
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+class PredictionRecord:
+    # Everything but these columns, the parsed fields and the prompt stays in the data JSON as details
+    __slots__ = ('date', 'game_id', 'model', 'game', 'timestamp', 'game_datetime', 'home_team', 'away_team',
+                 'response', 'pick', 'confidence', 'probability', 'prompt_hash', 'details')
+    FIELDS = ('game', 'timestamp', 'game_datetime', 'home_team', 'away_team', 'response', 'pick', 'confidence',
+              'probability', 'prompt_hash', 'query')
+    COLUMNS = "date, game_id, model, game, timestamp, pick, confidence, probability, prompt_hash, data"
+
+    def __init__(self, date, game_id, model, game, timestamp, game_datetime, home_team, away_team, response,
+                 pick=None, confidence=None, probability=None, prompt_hash=None, details=None):
+        self.date = date
+        self.game_id = str(game_id)
+        self.model = model
+        self.game = game
+        self.timestamp = timestamp
+        self.game_datetime = game_datetime
+        self.home_team = home_team
+        self.away_team = away_team
+        self.response = response
+        self.pick = pick
+        self.confidence = confidence
+        self.probability = probability
+        self.prompt_hash = prompt_hash
+        self.details = details or {}
+
+    @classmethod
+    def from_data(cls, date, game_id, model, data):
+        # The pick and confidence are parsed once here so readers never touch the free text
+        response = data.get('response')
+        home_team, away_team = data['home_team'], data['away_team']
+        return cls(
+            date, game_id, model, data['game'], data['timestamp'], data.get('game_datetime'), home_team, away_team,
+            response,
+            pick=data.get('pick') or extract_pick(response, home_team, away_team),
+            confidence=data.get('confidence') or extract_confidence(response),
+            probability=data.get('probability'),
+            prompt_hash=prompt_hash(data['query']) if data.get('query') else data.get('prompt_hash'),
+            details={key: value for key, value in data.items() if key not in cls.FIELDS}
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        date, game_id, model, game, timestamp, pick, confidence, probability, hashed, data = row
+        details = json.loads(data)
+        return cls(
+            date, game_id, model, game, timestamp, details.pop('game_datetime', None), details.pop('home_team'),
+            details.pop('away_team'), details.pop('response', None), pick, confidence, probability, hashed, details
+        )
+
+    def to_row(self):
+        data = dict(self.details, game_datetime=self.game_datetime, home_team=self.home_team,
+                    away_team=self.away_team, response=self.response)
+        return (self.date, self.game_id, self.model, self.game, self.timestamp, self.pick, self.confidence,
+                self.probability, self.prompt_hash, json.dumps(data, cls=DateTimeEncoder))
+
+    def as_dict(self):
+        # The flat shape earlier versions stored, minus the prompt
+        return dict(self.details, game=self.game, timestamp=self.timestamp, game_datetime=self.game_datetime,
+                    home_team=self.home_team, away_team=self.away_team, response=self.response, pick=self.pick,
+                    confidence=self.confidence, probability=self.probability, prompt_hash=self.prompt_hash)
+
+PREDICTION_SCHEMA_VERSION = 1
+
+class PredictionStore:
+    def __init__(self, path):
+        self.path = path
+        self.index = PredictionIndex()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS predictions (
+                    id INTEGER PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    game_id TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    game TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    pick TEXT,
+                    confidence TEXT,
+                    probability REAL,
+                    prompt_hash TEXT,
+                    data TEXT NOT NULL,
+                    UNIQUE (date, game_id, model)
+                )
+            """)
+            # Every model for a game is sent the same analysis prompt, so it is kept once
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS prompts (
+                    hash TEXT PRIMARY KEY,
+                    prompt TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    game_id TEXT PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    game TEXT NOT NULL,
+                    away_team TEXT NOT NULL,
+                    home_team TEXT NOT NULL,
+                    away_score INTEGER,
+                    home_score INTEGER,
+                    status TEXT NOT NULL,
+                    final INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_date ON results (date, final)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS results_days (
+                    date TEXT PRIMARY KEY,
+                    settled INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS backfill_days (
+                    date TEXT PRIMARY KEY,
+                    games INTEGER NOT NULL,
+                    predictions INTEGER NOT NULL,
+                    completed_at TEXT NOT NULL
+                )
+            """)
+            # (date, game, model) work items owned by one bot process until they expire
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    date TEXT NOT NULL,
+                    game_id TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (date, game_id, model)
+                )
+            """)
+            self._migrate()
+            self._conn.execute("""
+                CREATE VIEW IF NOT EXISTS consensus AS
+                SELECT date, game_id, MAX(game) AS game, pick, COUNT(*) AS votes,
+                       GROUP_CONCAT(model, ',') AS models, AVG(probability) AS probability
+                FROM predictions
+                GROUP BY date, game_id, pick
+            """)
+
+    def _migrate(self):
+        # Version 0 stored the full prompt in every row and never parsed the pick
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] >= PREDICTION_SCHEMA_VERSION:
+            return
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(predictions)")}
+        for column, kind in (('pick', 'TEXT'), ('confidence', 'TEXT'), ('probability', 'REAL'), ('prompt_hash', 'TEXT')):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE predictions ADD COLUMN {column} {kind}")
+        rows = self._conn.execute("SELECT id, date, game_id, model, data FROM predictions").fetchall()
+        for row_id, date, game_id, model, data in rows:
+            data = json.loads(data)
+            record = PredictionRecord.from_data(date, game_id, model, data)
+            if data.get('query'):
+                self._conn.execute("INSERT OR IGNORE INTO prompts (hash, prompt) VALUES (?, ?)", (record.prompt_hash, data['query']))
+            self._conn.execute(
+                "UPDATE predictions SET pick = ?, confidence = ?, probability = ?, prompt_hash = ?, data = ? WHERE id = ?",
+                record.to_row()[5:] + (row_id,)
+            )
+        self._conn.execute(f"PRAGMA user_version = {PREDICTION_SCHEMA_VERSION}")
+        if rows:
+            logger.info(f"Migrated {len(rows)} predictions to parsed picks and shared prompts")
+
+    def _insert(self, entries):
+        # entries are (record, prompt) pairs
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO prompts (hash, prompt) VALUES (?, ?)",
+                [(record.prompt_hash, prompt) for record, prompt in entries if prompt]
+            )
+            cursor = self._conn.executemany(
+                f"""
+                INSERT INTO predictions ({PredictionRecord.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (date, game_id, model) DO UPDATE SET
+                    timestamp = excluded.timestamp, pick = excluded.pick, confidence = excluded.confidence,
+                    probability = excluded.probability, prompt_hash = excluded.prompt_hash, data = excluded.data
+                WHERE json_extract(predictions.data, '$.partial')
+                """,
+                [record.to_row() for record, _ in entries]
+            )
+            return cursor.rowcount
+
+    def _existing_models(self, date, game_keys):
+        placeholders = ', '.join('?' for _ in game_keys)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT model FROM predictions WHERE date = ? AND game_id IN ({placeholders})",
+                (date, *game_keys)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def _existing_for_date(self, date):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT game_id, model FROM predictions WHERE date = ?", (date,)
+            ).fetchall()
+        return {(row[0], row[1]) for row in rows}
+
+    def _load_records(self, date=None):
+        query = f"SELECT {PredictionRecord.COLUMNS} FROM predictions"
+        params = ()
+        if date is not None:
+            query += " WHERE date = ?"
+            params = (date,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY date, id", params).fetchall()
+        return [PredictionRecord.from_row(row) for row in rows]
+
+    def _load(self, date=None):
+        return [(record.date, record.model, record.as_dict()) for record in self._load_records(date)]
+
+    def _prompt(self, hashed):
+        with self._lock:
+            row = self._conn.execute("SELECT prompt FROM prompts WHERE hash = ?", (hashed,)).fetchone()
+        return row[0] if row else None
+
+    def _consensus(self, date=None):
+        query = "SELECT date, game_id, game, pick, votes, models, probability FROM consensus"
+        params = ()
+        if date is not None:
+            query += " WHERE date = ?"
+            params = (date,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY date, game_id", params).fetchall()
+        games = {}
+        for day, game_id, game, pick, votes, models, probability in rows:
+            entry = games.setdefault((day, game_id), {
+                'date': day, 'game_id': game_id, 'game': game, 'models': 0, 'picks': {}, 'probabilities': {},
+            })
+            entry['models'] += votes
+            entry['picks'][pick] = models.split(',')
+            if probability is not None:
+                entry['probabilities'][pick] = probability
+        for entry in games.values():
+            counts = {pick: len(models) for pick, models in entry['picks'].items() if pick is not None}
+            leaders = [pick for pick, count in counts.items() if count == max(counts.values(), default=0)]
+            # A tie for the lead leaves the game without a consensus pick
+            entry['pick'] = leaders[0] if len(leaders) == 1 else None
+            entry['agreement'] = counts[entry['pick']] / entry['models'] if entry['pick'] is not None else 0.0
+            entry['probability'] = entry.pop('probabilities').get(entry['pick'])
+        return list(games.values())
+
+    def _load_results(self, start_date=None, end_date=None):
+        query = "SELECT game_id, date, game, away_team, home_team, away_score, home_score, status, final FROM results"
+        clauses, params = [], []
+        if start_date is not None:
+            clauses.append("date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            clauses.append("date <= ?")
+            params.append(end_date)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        columns = ('game_id', 'date', 'game', 'away_team', 'home_team', 'away_score', 'home_score', 'status', 'final')
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def entry(self, date, game_id, model, data):
+        return PredictionRecord.from_data(date, game_id, model, data), data.get('query')
+
+    async def append(self, date, game_id, model, data):
+        inserted = await run_blocking(self._insert, [self.entry(date, game_id, model, data)])
+        self.index.add(date, game_id, model)
+        return inserted > 0
+
+    async def ensure_index(self, date):
+        # Only touches disk at startup and on date rollover
+        if self.index.date != date:
+            self.index.reset(date, await self.existing_for_date(date))
+            logger.info(f"Loaded prediction index for {date} with {len(self.index)} entries")
+        return self.index
+
+    async def existing_models(self, date, *game_keys):
+        return await run_blocking(self._existing_models, date, [str(k) for k in game_keys])
+
+    async def existing_for_date(self, date):
+        return await run_blocking(self._existing_for_date, date)
+
+    async def load(self, date=None):
+        return await run_blocking(self._load, date)
+
+    async def load_records(self, date=None):
+        return await run_blocking(self._load_records, date)
+
+    async def prompt(self, hashed):
+        return await run_blocking(self._prompt, hashed)
+
+    async def consensus(self, date=None):
+        return await run_blocking(self._consensus, date)
+
+    async def load_results(self, start_date=None, end_date=None):
+        return await run_blocking(self._load_results, start_date, end_date)
+
+    def _settled_days(self, start_date, end_date):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date FROM results_days WHERE settled = 1 AND date BETWEEN ? AND ?", (start_date, end_date)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def _upsert_results(self, rows, settled_days):
+        with self._lock, self._conn:
+            # A final score is immutable, so only rows still in progress get overwritten
+            cursor = self._conn.executemany("""
+                INSERT INTO results (game_id, date, game, away_team, home_team, away_score, home_score, status, final)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (game_id) DO UPDATE SET
+                    date = excluded.date, away_score = excluded.away_score, home_score = excluded.home_score,
+                    status = excluded.status, final = excluded.final
+                WHERE results.final = 0
+            """, rows)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results_days (date, settled) VALUES (?, 1)", [(d,) for d in settled_days]
+            )
+            return cursor.rowcount
+
+    def _backfilled_days(self, start_date, end_date):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date FROM backfill_days WHERE date BETWEEN ? AND ?", (start_date, end_date)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def _mark_backfilled(self, date, games, predictions):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO backfill_days (date, games, predictions, completed_at) VALUES (?, ?, ?, ?)",
+                (date, games, predictions, get_current_et_time().isoformat())
+            )
+
+    async def settled_days(self, start_date, end_date):
+        return await run_blocking(self._settled_days, start_date, end_date)
+
+    async def upsert_results(self, rows, settled_days=()):
+        return await run_blocking(self._upsert_results, rows, list(settled_days))
+
+    async def backfilled_days(self, start_date, end_date):
+        return await run_blocking(self._backfilled_days, start_date, end_date)
+
+    async def mark_backfilled(self, date, games, predictions):
+        return await run_blocking(self._mark_backfilled, date, games, predictions)
+
+    def _acquire_leases(self, date, game_id, models, owner, ttl):
+        now = time.time()
+        placeholders = ', '.join('?' for _ in models)
+        with self._lock, self._conn:
+            # IMMEDIATE takes the write lock up front so two processes can't both see a free item
+            self._conn.execute("BEGIN IMMEDIATE")
+            finished = {row[0] for row in self._conn.execute(
+                f"SELECT model FROM predictions WHERE date = ? AND game_id = ? AND model IN ({placeholders})",
+                (date, game_id, *models)
+            )}
+            self._conn.executemany("""
+                INSERT INTO leases (date, game_id, model, owner, expires_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (date, game_id, model) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE leases.expires_at < ? OR leases.owner = excluded.owner
+            """, [(date, game_id, model, owner, now + ttl, now) for model in models if model not in finished])
+            owned = {row[0] for row in self._conn.execute(
+                f"SELECT model FROM leases WHERE date = ? AND game_id = ? AND owner = ? AND model IN ({placeholders})",
+                (date, game_id, owner, *models)
+            )}
+        return [model for model in models if model in owned and model not in finished], finished
+
+    def _release_leases(self, date, game_id, models, owner):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM leases WHERE date = ? AND game_id = ? AND model = ? AND owner = ?",
+                [(date, game_id, model, owner) for model in models]
+            )
+
+    def _renew_leases(self, owner, ttl):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+            return self._conn.execute("UPDATE leases SET expires_at = ? WHERE owner = ?", (now + ttl, owner)).rowcount
+
+    async def acquire_leases(self, date, game_id, models, owner, ttl):
+        return await run_blocking(self._acquire_leases, date, str(game_id), list(models), owner, ttl)
+
+    async def release_leases(self, date, game_id, models, owner):
+        return await run_blocking(self._release_leases, date, str(game_id), list(models), owner)
+
+    async def renew_leases(self, owner, ttl):
+        return await run_blocking(self._renew_leases, owner, ttl)
+
+    def import_json_tree(self, base_directory):
+        imported = 0
+        for date, model, path, predictions in iter_json_predictions(base_directory):
+            rows = [
+                self.entry(date, p.get('game_id') or p['game'], model, p)
+                for p in predictions if 'timestamp' in p
+            ]
+            count = self._insert(rows)
+            imported += count
+            logger.info(f"Imported {count} of {len(predictions)} predictions from {path}")
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_prediction_stores = {}
+
+LEASE_TTL = 120  # Seconds an unrenewed work item stays with a worker that may have crashed
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkLeases:
+    # Lets several bot processes share one prediction store without duplicating AskNews calls
+    def __init__(self, store, owner=None, ttl=LEASE_TTL):
+        self.store = store
+        self.owner = owner or worker_id()
+        self.ttl = ttl
+        self.held = 0
+
+    async def acquire(self, date, game_id, models):
+        acquired, finished = await self.store.acquire_leases(date, game_id, models, self.owner, self.ttl)
+        # Another worker's finished predictions never reach this process's index on their own
+        for model in finished:
+            self.store.index.add(date, game_id, model)
+        taken = len(models) - len(acquired) - len(finished)
+        if taken:
+            metrics.inc('lease_conflicts_total', taken)
+            logger.info(f"{taken} models for game {game_id} are leased by another worker")
+        self.held += len(acquired)
+        return acquired
+
+    async def release(self, date, game_id, models):
+        if models:
+            await self.store.release_leases(date, game_id, models, self.owner)
+            self.held -= len(models)
+
+    async def keep_alive(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            if self.held:
+                await self.store.renew_leases(self.owner, self.ttl)
+
+def get_prediction_store(base_directory):
+    path = os.path.join(base_directory, 'predictions.db')
+    if path not in _prediction_stores:
+        _prediction_stores[path] = PredictionStore(path)
+    return _prediction_stores[path]
+
+async def append_game_result(data, base_directory, model, game_date=None):
+    # Stored under the game's ET date so backfilled predictions land on the day they were for
+    current_date = game_date or get_current_et_time().strftime('%Y-%m-%d')
+    store = get_prediction_store(base_directory)
     
     data['timestamp'] = get_current_et_time().isoformat()
+    game_id = data.get('game_id') or data['game']
     try:
-        async with aiofiles.open(filepath, mode='a+') as f:
-            await f.seek(0)
-            content = await f.read()
-            predictions = json.loads(content) if content else []
-            predictions.append(data)
-            await f.seek(0)
-            await f.truncate()
-            await f.write(json.dumps(predictions, indent=2, cls=DateTimeEncoder))
-        logger.info(f"Successfully appended game result to {filepath}")
-    except IOError as e:
-        logger.error(f"Error appending game result to file: {str(e)}")
+        with metrics.timer('write', model=model):
+            inserted = await store.append(current_date, game_id, model, data)
+        if inserted:
+            logger.info(f"Successfully stored {model} prediction for {data['game']} in {store.path}")
+        else:
+            logger.info(f"{model} prediction for {data['game']} already stored for {current_date}")
+    except sqlite3.Error as e:
+        logger.error(f"Error storing game result: {str(e)}")
         raise
 
+RESULTS_CHUNK_DAYS = 31  # Days covered by one schedule request
+RESULTS_FIELDS = ("dates,date,games,gamePk,officialDate,status,abstractGameState,detailedState,"
+                  "teams,away,home,team,name,score")
+UNPLAYED_STATES = ('Postponed', 'Cancelled')
+
+def date_range(start_date, end_date):
+    day = datetime.strptime(start_date, '%Y-%m-%d').date()
+    last = datetime.strptime(end_date, '%Y-%m-%d').date()
+    while day <= last:
+        yield day.strftime('%Y-%m-%d')
+        day += timedelta(days=1)
+
+class ResultsIngester:
+    def __init__(self, store):
+        self.store = store
+
+    def chunks(self, dates):
+        # Contiguous runs of pending dates, each fetched with one startDate/endDate request
+        runs = []
+        for day in dates:
+            previous = runs[-1][-1] if runs else None
+            contiguous = previous is not None and (
+                datetime.strptime(day, '%Y-%m-%d') - datetime.strptime(previous, '%Y-%m-%d')
+            ).days == 1
+            if contiguous and len(runs[-1]) < RESULTS_CHUNK_DAYS:
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+        return [(run[0], run[-1]) for run in runs]
+
+    async def fetch_range(self, start_date, end_date):
+        url = (f"{MLB_STATS_API_URL}/schedule?sportId=1&startDate={start_date}"
+               f"&endDate={end_date}&fields={RESULTS_FIELDS}")
+
+        async def fetch():
+            session = await get_http_session()
+            async with session.get(url) as response:
+                response.raise_for_status()
+                return await response.json()
+
+        start_time = time.time()
+        schedule_data = await retry_policy.call(
+            'results', lambda timeout: asyncio.wait_for(fetch(), timeout), attempt_timeout=60
+        )
+        elapsed_time = time.time() - start_time
+        logger.info(f"API call to fetch results for {start_date} to {end_date} took {elapsed_time:.2f} seconds")
+        return schedule_data
+
+    def parse(self, schedule_data):
+        rows = []
+        open_days = set()
+        for day in schedule_data.get('dates', []):
+            for game in day['games']:
+                away, home = game['teams']['away'], game['teams']['home']
+                state = game['status']['detailedState']
+                final = game['status']['abstractGameState'] == 'Final' and state not in UNPLAYED_STATES
+                if not final and state not in UNPLAYED_STATES:
+                    open_days.add(day['date'])
+                rows.append((
+                    str(game['gamePk']), game.get('officialDate', day['date']),
+                    f"{away['team']['name']} vs {home['team']['name']}",
+                    away['team']['name'], home['team']['name'],
+                    away.get('score'), home.get('score'), state, int(final)
+                ))
+        return rows, open_days
+
+    async def ingest(self, start_date, end_date):
+        today = get_current_et_time().strftime('%Y-%m-%d')
+        settled = await self.store.settled_days(start_date, end_date)
+        pending = [day for day in date_range(start_date, end_date) if day not in settled and day <= today]
+        if not pending:
+            logger.info(f"Results for {start_date} to {end_date} are already settled")
+            return 0
+        payloads = await asyncio.gather(*(self.fetch_range(a, b) for a, b in self.chunks(pending)))
+        rows, open_days = [], set()
+        for payload in payloads:
+            parsed_rows, parsed_open = self.parse(payload)
+            rows.extend(parsed_rows)
+            open_days |= parsed_open
+        # Past days with every game decided (or no games at all) are never requested again
+        settled_days = [day for day in pending if day < today and day not in open_days]
+        written = await self.store.upsert_results(rows, settled_days)
+        logger.info(f"Stored {written} results across {len(pending)} days, {len(settled_days)} now settled")
+        return written
+
+BACKFILL_CONCURRENT_DAYS = 4  # Past dates scraped and fanned out at once; every AskNews call still shares one limiter
+
+class Backfill:
+    def __init__(self, base_directory=DATA_DIRECTORY, limiter=None, concurrent_days=BACKFILL_CONCURRENT_DAYS, models=None):
+        self.base_directory = base_directory
+        self.store = get_prediction_store(base_directory)
+        self.limiter = limiter or AdaptiveLimiter()
+        self.research_cache = ResearchCache()
+        self.response_cache = ResponseCache(os.path.join(base_directory, 'response_cache.db'))
+        # Chat completions run their own live news search with no cutoff, so a past game would see its result
+        self.models = [model for model in models or prediction_models() if model.endswith('_forecast')]
+        skipped = sorted(set(models or prediction_models()) - set(self.models))
+        if skipped:
+            (logger.warning if models else logger.info)(
+                f"Chat models are not backfilled, they cannot be cut off at first pitch: {', '.join(skipped)}"
+            )
+        self.leases = WorkLeases(self.store)
+        self.concurrent_days = concurrent_days
+        self.stats = {'days': 0, 'games': 0, 'predictions': 0, 'failures': 0}
+
+    async def run(self, start_date, end_date):
+        today = get_current_et_time().strftime('%Y-%m-%d')
+        completed = await self.store.backfilled_days(start_date, end_date)
+        pending = [day for day in date_range(start_date, end_date) if day not in completed and day < today]
+        logger.info(f"Backfilling {len(pending)} days from {start_date} to {end_date}, {len(completed)} already complete")
+        days = asyncio.Semaphore(self.concurrent_days)
+
+        async def run_day(day):
+            async with days:
+                with metrics.timer('backfill_day'):
+                    return await self.backfill_day(day)
+
+        keep_alive = asyncio.create_task(self.leases.keep_alive())
+        try:
+            results = await asyncio.gather(*(run_day(day) for day in pending), return_exceptions=True)
+        finally:
+            keep_alive.cancel()
+        for day, result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.error(f"{Fore.RED}Backfill of {day} failed, it will be retried on the next run: {str(result)}{Style.RESET_ALL}")
+        return self.stats
+
+    async def backfill_day(self, day):
+        odds_cache = OddsCache(game_date=day)
+        await odds_cache.daily_scrape()
+        existing = await self.store.existing_for_date(day)
+        games = [
+            game for game in odds_cache.schedule
+            if not is_unplayed(game)
+        ]
+        results = await asyncio.gather(*(self.backfill_game(game, odds_cache, existing) for game in games))
+        stored = sum(stored for stored, _ in results)
+        failures = sum(failed for _, failed in results)
+        self.stats['games'] += len(games)
+        self.stats['predictions'] += stored
+        self.stats['failures'] += failures
+        # A day is only checkpointed once every game and model has a prediction
+        if failures:
+            logger.warning(f"Backfill of {day}: {stored} predictions stored, {failures} failed")
+            return stored
+        await self.store.mark_backfilled(day, len(games), stored)
+        self.stats['days'] += 1
+        logger.info(f"{Fore.GREEN}Backfilled {day}: {len(games)} games, {stored} new predictions{Style.RESET_ALL}")
+        return stored
+
+    async def backfill_game(self, game, odds_cache, existing):
+        missing_models = [model for model in self.models if (str(game['id']), model) not in existing]
+        if not missing_models:
+            return 0, 0
+        day = game['game_time'].strftime('%Y-%m-%d')
+        leased = await self.leases.acquire(day, game['id'], missing_models)
+        try:
+            stored, failed = await self.predict(game, odds_cache, leased)
+        finally:
+            await self.leases.release(day, game['id'], leased)
+        # Models another worker holds count as unfinished here, the day is checkpointed once a run sees them stored
+        return stored, failed + len(missing_models) - len(leased)
+
+    async def predict(self, game, odds_cache, missing_models):
+        if not missing_models:
+            return 0, 0
+        # Research and forecasts are cut off at first pitch so a past game is predicted as it would have been live
+        as_of = game['game_time']
+        try:
+            research_context = await self.research_cache.get(game['away_team'], game['home_team'], self.limiter, as_of=as_of)
+        except Exception as e:
+            logger.error(f"News retrieval failed for {game['away_team']} vs {game['home_team']} on {as_of.date()}: {str(e)}")
+            research_context = None
+
+        model_tasks = []
+        for model in missing_models:
+            is_forecast = model.endswith('_forecast')
+            actual_model = model[:-9] if is_forecast else model
+            model_tasks.append(process_game(
+                game['game_data'], odds_cache, self.base_directory, actual_model, is_forecast, self.limiter, None,
+                research_context, self.response_cache, as_of
+            ))
+        results = await asyncio.gather(*model_tasks, return_exceptions=True)
+        failed = sum(1 for result in results if result is None or isinstance(result, Exception))
+        return len(results) - failed, failed
+
+PREDICTION_LEAD_TIMES = (60, 15)  # Minutes before first pitch at which each game is processed
+SCHEDULE_REFRESH_INTERVAL = 300  # Seconds between MLB Stats API schedule checks; an unchanged schedule is a 304
+HEARTBEAT_INTERVAL = 1800  # Seconds between heartbeats and their missing-prediction retries
+
+class GameScheduler:
+    def __init__(self, lead_times=PREDICTION_LEAD_TIMES):
+        self.lead_times = sorted(lead_times, reverse=True)
+        self._heap = []
+        self._games = {}
+        self._counter = itertools.count()
+
+    def apply(self, events, now=None):
+        now = now or get_current_et_time()
+        # Heap entries for dropped or moved games are discarded lazily when they surface
+        for event in events:
+            game = event['game']
+            tracked = game['id'] in self._games
+            if event['type'] == 'removed' or is_unplayed(game):
+                self._games.pop(game['id'], None)
+                continue
+            self._games[game['id']] = game
+            if event['type'] == 'time_change' and tracked:
+                previous = event['previous']
+                logger.info(f"Rescheduling {game['away_team']} vs {game['home_team']}: first pitch moved from "
+                            f"{previous['game_time'].strftime('%H:%M ET')} to {game['game_time'].strftime('%H:%M ET')}")
+            if event['type'] in ('new', 'time_change') or not tracked:
+                self._schedule(game, now)
+
+    def _schedule(self, game, now):
+        if game['game_time'] <= now:
+            return
+        fire_times = [game['game_time'] - timedelta(minutes=lead) for lead in self.lead_times]
+        upcoming = [fire_at for fire_at in fire_times if fire_at > now]
+        if len(upcoming) < len(fire_times):
+            upcoming.insert(0, now)  # At least one lead time already passed, process right away
+        for fire_at in upcoming:
+            heapq.heappush(self._heap, (fire_at, next(self._counter), game['id'], game['game_time']))
+
+    def _is_stale(self, entry):
+        game = self._games.get(entry[2])
+        return game is None or game['game_time'] != entry[3]
+
+    def next_wakeup(self):
+        while self._heap and self._is_stale(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        now = now or get_current_et_time()
+        due = {}
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._is_stale(entry):
+                due[entry[2]] = self._games[entry[2]]
+        return list(due.values())
+
+    async def wait(self, until):
+        next_event = self.next_wakeup()
+        if next_event is not None:
+            until = min(until, next_event)
+        # Reschedules only arrive with a schedule refresh, and the loop recomputes the wakeup after each one
+        await asyncio.sleep(max(0, (until - get_current_et_time()).total_seconds()))
+
 class MLBBot:
-    def __init__(self):
-        self.base_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mlb_data')
+    def __init__(self, lead_times=PREDICTION_LEAD_TIMES, base_directory=DATA_DIRECTORY, metrics_port=None):
+        self.base_directory = base_directory
         ensure_directory(self.base_directory)
-        self.odds_cache = OddsCache()
+        self.odds_cache = OddsCache(history=OddsHistory(os.path.join(self.base_directory, 'odds_history')))
+        self.prediction_store = get_prediction_store(self.base_directory)
+        self.scheduler = GameScheduler(lead_times)
+        self.prediction_window = max(lead_times) * 60
         self.running = True
         self.today_games = []
-        self.api_semaphore = Semaphore(5)  # Limit to 5 concurrent API calls
+        self.schedule_sync = ScheduleSync()
+        self.in_flight = set()
+        self.background_tasks = set()
+        self.heartbeat_task = None
+        self.limiter = AdaptiveLimiter()  # Shared AskNews concurrency window and per-model budgets
+        self.research_cache = ResearchCache()
+        self.response_cache = ResponseCache(os.path.join(self.base_directory, 'response_cache.db'))
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.leases = WorkLeases(self.prediction_store)
+        metrics.collect('bot', self.metric_samples)
     
     async def setup(self):
         loop = asyncio.get_running_loop()
@@ -357,6 +2452,7 @@ class MLBBot:
             loop.add_signal_handler(
                 s, lambda s=s: asyncio.create_task(self.shutdown(s))
             )
+        await self.prediction_store.ensure_index(get_current_et_time().strftime('%Y-%m-%d'))
         try:
             await asyncio.wait_for(self.odds_cache.daily_scrape(), timeout=300)  # 5 minute timeout
         except asyncio.TimeoutError:
@@ -371,17 +2467,42 @@ class MLBBot:
         [task.cancel() for task in tasks]
         logger.info(f"Cancelling {len(tasks)} outstanding tasks")
         await asyncio.gather(*tasks, return_exceptions=True)
+        self.odds_cache.history.flush()
+        await close_http_session()
         loop = asyncio.get_running_loop()
         loop.stop()
 
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
     async def run(self):
         await self.setup()
+        if self.metrics_port is not None:
+            self.metrics_server = await start_metrics_server(self.metrics_port)
+        self.spawn(self.leases.keep_alive())
+        self.spawn(self.flush_odds_history())
+        logger.info(f"Running as worker {self.leases.owner}")
+        next_refresh = None
+        next_heartbeat = None
         while self.running:
             try:
-                await self.fetch_today_games()
-                await self.process_upcoming_games()
-                await self.heartbeat()
-                await asyncio.sleep(900)  # Sleep for 15 minutes
+                if next_refresh is None or get_current_et_time() >= next_refresh:
+                    self.scheduler.apply(await self.fetch_today_games())
+                    heartbeat_due = next_heartbeat is None or get_current_et_time() >= next_heartbeat
+                    if heartbeat_due and (self.heartbeat_task is None or self.heartbeat_task.done()):
+                        self.heartbeat_task = self.spawn(self.heartbeat())
+                        next_heartbeat = get_current_et_time() + timedelta(seconds=HEARTBEAT_INTERVAL)
+                    next_refresh = get_current_et_time() + timedelta(seconds=SCHEDULE_REFRESH_INTERVAL)
+
+                due_games = self.scheduler.pop_due()
+                if due_games:
+                    self.spawn(self.process_upcoming_games(due_games))
+
+                # Idle until the next lead time or the next schedule refresh
+                await self.scheduler.wait(next_refresh)
             except asyncio.CancelledError:
                 logger.info("Main loop cancelled")
                 break
@@ -389,13 +2510,27 @@ class MLBBot:
                 logger.error(f"An error occurred in the main loop: {str(e)}")
                 await asyncio.sleep(60)  # Sleep for 1 minute before retrying
         
+        self.odds_cache.history.flush()
+        await close_http_session()
+        if self.metrics_server is not None:
+            await self.metrics_server.cleanup()
         logger.info("Graceful shutdown complete.")
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=60))
+    async def flush_odds_history(self):
+        # Line history survives a restart even though only evicted days are written otherwise
+        while True:
+            await asyncio.sleep(ODDS_HISTORY_FLUSH_INTERVAL)
+            self.odds_cache.history.flush()
+
     async def fetch_today_games(self):
         try:
-            self.today_games = await asyncio.wait_for(fetch_today_games(), timeout=180)
-            logger.info(f"Successfully fetched {len(self.today_games)} games for today")
+            # Unchanged refreshes return no events and leave today's games and the odds join alone
+            events = await self.schedule_sync.refresh()
+            if events:
+                self.today_games = self.schedule_sync.list()
+                self.odds_cache.set_schedule(self.today_games)
+                logger.info(f"Successfully fetched {len(self.today_games)} games for today")
+            return events
         except asyncio.TimeoutError:
             logger.error("Fetching today's games timed out")
             raise
@@ -403,24 +2538,33 @@ class MLBBot:
             logger.error(f"Error fetching today's games: {str(e)}")
             raise
 
-    async def process_upcoming_games(self):
+    async def process_upcoming_games(self, games=None):
         current_time = get_current_et_time()
         tasks = []
+        if games is None:
+            games = self.today_games
         
-        for game in self.today_games:
+        # Earliest first pitch first, so its research and model calls queue ahead of later games
+        for game in sorted(games, key=lambda game: game['game_time']):
             if not self.running:
                 break
+            if is_unplayed(game):
+                continue
 
             time_until_game = (game['game_time'] - current_time).total_seconds()
 
-            if 0 <= time_until_game <= 3600:  # Within 60 minutes of game start
-                models = ["gpt-4o", "meta-llama/Meta-Llama-3-70B-Instruct", "claude-3-5-sonnet-20240620"]
-                forecast_models = ["claude-3-5-sonnet-20240620", "gpt-4o"]
-                
-                missing_models = await self.check_existing_predictions(game, models + [f"{m}_forecast" for m in forecast_models])
+            if 0 <= time_until_game <= self.prediction_window:
+                missing_models = await self.check_existing_predictions(game, prediction_models())
                 
                 if missing_models:
                     tasks.append(self.process_single_game(game, missing_models))
+
+        if tasks:
+            # One slate scrape per pass; every game in this pass reads from it
+            try:
+                await self.odds_cache.refresh_slate()
+            except Exception as e:
+                logger.error(f"Error refreshing odds slate: {str(e)}")
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
         for result in results:
@@ -429,17 +2573,33 @@ class MLBBot:
 
     async def process_single_game(self, game, missing_models):
         game_description = f"{game['away_team']} vs {game['home_team']}"
-        logger.info(f"{Fore.CYAN}Processing game: {game_description}{Style.RESET_ALL}")
+        # Another pass may already be working on some of these models
+        missing_models = [model for model in missing_models if (game['id'], model) not in self.in_flight]
+        if not missing_models:
+            return
+        claimed = {(game['id'], model) for model in missing_models}
+        self.in_flight |= claimed
+        game_date = game['game_time'].strftime('%Y-%m-%d')
+        leased = []
         try:
-            await self.odds_cache.update_game_odds(game['id'], game['away_team'], game['home_team'])
-            
-            model_tasks = []
-            for model in missing_models:
-                is_forecast = model.endswith('_forecast')
-                actual_model = model[:-9] if is_forecast else model
-                model_tasks.append(self.process_game(game['game_data'], actual_model, is_forecast))
-            
-            results = await asyncio.gather(*model_tasks, return_exceptions=True)
+            # Other bot processes sharing the store may already own some of these
+            leased = await self.leases.acquire(game_date, game['id'], missing_models)
+            if not leased:
+                return
+            missing_models = leased
+            logger.info(f"{Fore.CYAN}Processing game: {game_description}{Style.RESET_ALL}")
+            with metrics.trace('game', game_id=game['id'], game=game_description, models=missing_models), metrics.timer('game'):
+                with metrics.timer('odds'):
+                    await self.odds_cache.update_game_odds(game['id'], game['away_team'], game['home_team'])
+                research_context = await self.fetch_research(game)
+
+                model_tasks = []
+                for model in missing_models:
+                    is_forecast = model.endswith('_forecast')
+                    actual_model = model[:-9] if is_forecast else model
+                    model_tasks.append(self.process_game(game['game_data'], actual_model, is_forecast, research_context))
+
+                results = await asyncio.gather(*model_tasks, return_exceptions=True)
             for result in results:
                 if isinstance(result, Exception):
                     logger.error(f"{Fore.RED}Error processing model for game {game_description}: {str(result)}{Style.RESET_ALL}")
@@ -448,84 +2608,77 @@ class MLBBot:
         except Exception as e:
             logger.error(f"{Fore.RED}Failed to process game {game_description}: {str(e)}{Style.RESET_ALL}")
             raise
+        finally:
+            self.in_flight -= claimed
+            await self.leases.release(game_date, game['id'], leased)
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=60))
-    async def process_game(self, game_data, model, is_forecast=False):
+    async def fetch_research(self, game):
+        try:
+            return await self.research_cache.get(
+                game['away_team'], game['home_team'], self.limiter, deadline_from(game['game_time'])
+            )
+        except Exception as e:
+            logger.error(f"{Fore.RED}News retrieval failed for {game['away_team']} vs {game['home_team']}, "
+                         f"models will research on their own: {str(e)}{Style.RESET_ALL}")
+            return None
+
+    async def process_game(self, game_data, model, is_forecast=False, research_context=None):
         game_description = f"{game_data['teams']['away']['team']['name']} vs {game_data['teams']['home']['team']['name']}"
         logger.info(f"{Fore.YELLOW}Processing game: {game_description} with model: {model}{Style.RESET_ALL}")
 
         try:
-            async with self.api_semaphore:
-                start_time = time.time()
-                result = await asyncio.wait_for(
-                    process_game(game_data, self.odds_cache, self.base_directory, model, is_forecast),
-                    timeout=180  # 180 second timeout
+            start_time = time.time()
+            # The whole retry budget for this prediction runs out at first pitch
+            deadline = deadline_from(parse_game_time(game_data))
+            with metrics.timer('prediction', model=f"{model}_forecast" if is_forecast else model):
+                result = await process_game(
+                    game_data, self.odds_cache, self.base_directory, model, is_forecast, self.limiter, deadline,
+                    research_context, self.response_cache
                 )
-                elapsed_time = time.time() - start_time
-                logger.info(f"{Fore.GREEN}API call for {game_description} with model {model} took {elapsed_time:.2f} seconds{Style.RESET_ALL}")
+            elapsed_time = time.time() - start_time
+            logger.info(f"{Fore.GREEN}API call for {game_description} with model {model} took {elapsed_time:.2f} seconds{Style.RESET_ALL}")
             logger.info(f"{Fore.GREEN}Finished processing game: {game_description} with model: {model}{Style.RESET_ALL}")
             return result
-        except asyncio.TimeoutError:
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            metrics.inc('deadline_misses_total', model=f"{model}_forecast" if is_forecast else model)
             logger.error(f"{Fore.RED}Timeout processing game {game_description} with model {model}{Style.RESET_ALL}")
             raise
         except Exception as e:
             logger.error(f"{Fore.RED}Error processing game {game_description} with model {model}: {str(e)}{Style.RESET_ALL}")
             raise
 
+    def metric_samples(self):
+        for field, value in self.limiter.snapshot().items():
+            yield f"asknews_limiter_{field}", {}, value
+        yield 'predictions_in_flight', {}, len(self.in_flight)
+        yield 'response_cache_hits_total', {}, self.response_cache.hits
+        yield 'response_cache_misses_total', {}, self.response_cache.misses
+        yield 'odds_games_matched', {}, len(self.odds_cache.odds)
+        yield 'odds_games_unmatched', {}, len(self.odds_cache.unmatched)
+
     async def check_existing_predictions(self, game, models):
         current_date = get_current_et_time().strftime('%Y-%m-%d')
-        directory = os.path.join(self.base_directory, 'predictions', current_date)
         game_description = f"{game['away_team']} vs {game['home_team']}"
         
-        missing_models = []
-        for model in models:
-            filename = f"{model.replace('/', '_')}_predictions.json"
-            filepath = os.path.join(directory, filename)
-            if not os.path.exists(filepath):
-                missing_models.append(model)
-            else:
-                async with aiofiles.open(filepath, 'r') as f:
-                    content = await f.read()
-                    predictions = json.loads(content)
-                    if not any(p['game'] == game_description for p in predictions):
-                        missing_models.append(model)
-        
-        return missing_models
+        # Records imported from the JSON tree are keyed by description rather than gamePk
+        index = await self.prediction_store.ensure_index(current_date)
+        return index.missing((game['id'], game_description), models)
 
     async def check_missing_predictions(self):
         current_time = get_current_et_time()
         current_date = current_time.strftime('%Y-%m-%d')
-        directory = os.path.join(self.base_directory, 'predictions', current_date)
-        
-        models = ["gpt-4o", "meta-llama/Meta-Llama-3-70B-Instruct", "claude-3-5-sonnet-20240620"]
-        forecast_models = ["claude-3-5-sonnet-20240620", "gpt-4o"]
         
         missing_predictions = {}
-
-        # Load all existing predictions
-        existing_predictions = {}
-        for model in models + [f"{m}_forecast" for m in forecast_models]:
-            filename = f"{model.replace('/', '_')}_predictions.json"
-            filepath = os.path.join(directory, filename)
-            if os.path.exists(filepath):
-                async with aiofiles.open(filepath, 'r') as f:
-                    content = await f.read()
-                    predictions = json.loads(content)
-                    existing_predictions[model] = {p['game']: p for p in predictions}
+        index = await self.prediction_store.ensure_index(current_date)
 
         for game in self.today_games:
             time_until_game = (game['game_time'] - current_time).total_seconds()
-            if 0 <= time_until_game <= 3600:  # Within 60 minutes of game start
+            if 0 <= time_until_game <= self.prediction_window and not is_unplayed(game):
                 game_id = game['id']
                 game_description = f"{game['away_team']} vs {game['home_team']}"
-                missing_predictions[game_id] = {'game': game, 'missing_models': []}
-                
-                for model in models + [f"{m}_forecast" for m in forecast_models]:
-                    if model not in existing_predictions or game_description not in existing_predictions[model]:
-                        missing_predictions[game_id]['missing_models'].append(model)
-                
-                if not missing_predictions[game_id]['missing_models']:
-                    del missing_predictions[game_id]
+                missing_models = index.missing((game_id, game_description), prediction_models())
+                if missing_models:
+                    missing_predictions[game_id] = {'game': game, 'missing_models': missing_models}
 
         return missing_predictions
 
@@ -565,23 +2718,36 @@ class MLBBot:
         
         logger.info(heartbeat_message)
 
+        limiter_stats = self.limiter.snapshot()
+        logger.info(f"{Fore.WHITE}AskNews limiter: window {limiter_stats['window']}, in flight {limiter_stats['in_flight']}, "
+                    f"queued {limiter_stats['queue_depth']}, avg wait {limiter_stats['avg_wait']:.2f}s, "
+                    f"max wait {limiter_stats['max_wait']:.2f}s, 429s {limiter_stats['throttled']}, "
+                    f"timeouts {limiter_stats['timeouts']}, dropped past deadline {limiter_stats['expired']} "
+                    f"({limiter_stats['miss_rate']:.1%}){Style.RESET_ALL}")
+
+        matched = len(self.odds_cache.odds)
+        logger.info(f"{Fore.WHITE}Odds join: {matched} games matched, {len(self.odds_cache.unmatched)} unmatched{Style.RESET_ALL}")
+        logger.info(f"{Fore.WHITE}Response cache: {self.response_cache.hits} hits, {self.response_cache.misses} misses{Style.RESET_ALL}")
+        for name, stats in retry_policy.snapshot().items():
+            logger.info(f"{Fore.WHITE}Retries for {name}: {stats['attempts']} attempts over {stats['calls']} calls "
+                        f"({stats['amplification']:.2f}x), {stats['timeouts']} timeouts, {stats['failures']} failures{Style.RESET_ALL}")
+
         # Check for missing predictions and retry
         missing_predictions = await self.check_missing_predictions()
         if missing_predictions:
             logger.info(f"{Fore.YELLOW}Found missing predictions. Details:{Style.RESET_ALL}")
-            for game_id, data in missing_predictions.items():
+            tasks = []
+            for game_id, data in sorted(missing_predictions.items(), key=lambda item: item[1]['game']['game_time']):
                 game = data['game']
                 missing_models = data['missing_models']
                 logger.info(f"{Fore.CYAN}Game: {game['away_team']} vs {game['home_team']}{Style.RESET_ALL}")
                 logger.info(f"{Fore.CYAN}Missing models: {', '.join(missing_models)}{Style.RESET_ALL}")
-                for model in missing_models:
-                    is_forecast = model.endswith('_forecast')
-                    actual_model = model[:-9] if is_forecast else model
-                    try:
-                        await self.process_game(game['game_data'], actual_model, is_forecast)
-                        logger.info(f"{Fore.GREEN}Successfully processed prediction for {game['away_team']} vs {game['home_team']} with model {model}{Style.RESET_ALL}")
-                    except Exception as e:
-                        logger.error(f"{Fore.RED}Error retrying prediction for {game['away_team']} vs {game['home_team']} with model {model}: {str(e)}{Style.RESET_ALL}")
+                tasks.append(self.process_single_game(game, missing_models))
+            # The limiter paces these retries alongside any scheduled work
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"{Fore.RED}Error retrying missing predictions: {str(result)}{Style.RESET_ALL}")
         else:
             logger.info(f"{Fore.GREEN}All predictions are up to date.{Style.RESET_ALL}")
 
@@ -591,8 +2757,45 @@ class MLBBot:
         minutes, _ = divmod(remainder, 60)
         return f"{hours:02d}:{minutes:02d}"
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="MLB LLM/AI betting bot")
+    parser.add_argument('--import-json', action='store_true',
+                        help="Import the predictions/<date>/*.json tree into the prediction store and exit")
+    parser.add_argument('--ingest-results', nargs=2, metavar=('START_DATE', 'END_DATE'),
+                        help="Fetch final scores for a date range (YYYY-MM-DD) into the prediction store and exit")
+    parser.add_argument('--backfill', nargs=2, metavar=('START_DATE', 'END_DATE'),
+                        help="Predict every game in a past date range (YYYY-MM-DD), resuming where a previous run stopped, and exit")
+    parser.add_argument('--backfill-days', type=int, default=BACKFILL_CONCURRENT_DAYS,
+                        help="Dates backfilled concurrently")
+    parser.add_argument('--metrics-port', type=int,
+                        help="Serve /metrics, /metrics.json and /traces on this local port")
+    parser.add_argument('--trace', action='store_true', help="Record a span trace for each game's prediction pass")
+    return parser.parse_args()
+
 async def main():
-    bot = MLBBot()
+    configure_logging()
+    args = parse_args()
+    metrics.tracing = args.trace
+    bot = MLBBot(metrics_port=args.metrics_port)
+    if args.import_json:
+        imported = bot.prediction_store.import_json_tree(bot.base_directory)
+        logger.info(f"Imported {imported} predictions into {bot.prediction_store.path}")
+        return
+    if args.ingest_results:
+        try:
+            await ResultsIngester(bot.prediction_store).ingest(*args.ingest_results)
+        finally:
+            await close_http_session()
+        return
+    get_app_context()  # Fail fast on missing credentials before the bot starts
+    if args.backfill:
+        try:
+            stats = await Backfill(bot.base_directory, bot.limiter, args.backfill_days).run(*args.backfill)
+            logger.info(f"Backfill complete: {stats['days']} days, {stats['games']} games, "
+                        f"{stats['predictions']} predictions stored, {stats['failures']} failed")
+        finally:
+            await close_http_session()
+        return
     try:
         await bot.run()
     except asyncio.CancelledError: